@@ -9,22 +9,49 @@ This application provides interfaces for:
 """
 
 import os
+
+# Keep numeric libraries single-threaded; per-request workloads are tiny, so
+# parallelism comes from gunicorn workers instead. Must be set before numpy loads.
+for thread_var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS'):
+    os.environ.setdefault(thread_var, '1')
+
 import pickle
+import joblib
 import pandas as pd
 import numpy as np
 import json
+import logging
 import uuid
-import random
 import asyncio
-from flask import Flask, render_template, request, jsonify, session, make_response
+import functools
+import operator
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, request, jsonify, session, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-from utils.time_predictions import convert_numpy_types, predict_failure_timeline
+from utils.time_predictions import convert_numpy_types, predict_failure_timeline, calculate_cumulative_failure_timeline
 from utils.database import connect_to_supabase
 from utils.chat import generate_chat_response, search_database_for_context
 from utils.openai_realtime import OpenAIRealtimeClient
 from openai import OpenAI
 
+# ONNX Runtime is optional; models are served through scikit-learn without it
+try:
+    import onnxruntime as ort
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType, StringTensorType
+    onnx_available = True
+except ImportError:
+    onnx_available = False
+
+# orjson is optional; JSON responses fall back to Flask's jsonify without it
+try:
+    import orjson
+    orjson_available = True
+except ImportError:
+    orjson_available = False
+
 # Load environment variables
 load_dotenv()
 
@@ -47,9 +74,22 @@ client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 # Embedding model to use
 EMBEDDING_MODEL = "text-embedding-3-small"
 
+# CORS headers shared by preflight responses and JSON API responses
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+}
+
+# Maximum number of texts accepted by the batch embeddings endpoint
+MAX_EMBEDDING_BATCH = int(os.getenv("MAX_EMBEDDING_BATCH", 64))
+
 # Connect to Supabase
 supabase = connect_to_supabase()
 
+# Shared pool for per-component predictions
+prediction_executor = ThreadPoolExecutor(max_workers=8)
+
 # Global variable to store the cached inventory value
 CACHED_TOTAL_INVENTORY = None
 
@@ -64,48 +104,150 @@ def load_models():
         return models
     
     # Load each model file
-    for filename in os.listdir(MODELS_DIR):
-        if filename.endswith('_model.pkl'):
-            component_name = filename.replace('_model.pkl', '').replace('_', ' ')
-            model_path = os.path.join(MODELS_DIR, filename)
-            
+    for model_path in Path(MODELS_DIR).glob('*_model.pkl'):
+        component_name = model_path.stem[:-len('_model')].replace('_', ' ')
+        
+        try:
+            # Memory-map numpy arrays in joblib dumps so forked workers share them
             try:
-                with open(model_path, 'rb') as f:
+                model = joblib.load(model_path, mmap_mode='r')
+            except Exception:
+                with model_path.open('rb') as f:
                     model = pickle.load(f)
-                    models[component_name] = model
-                    print(f"Loaded model for {component_name}")
-            except Exception as e:
-                print(f"Error loading model for {component_name}: {str(e)}")
+            models[component_name] = model
+            print(f"Loaded model for {component_name}")
+        except Exception as e:
+            print(f"Error loading model for {component_name}: {str(e)}")
     
     return models
 
+# Compile a trained model to ONNX Runtime
+def compile_model_to_onnx(component_model):
+    """Convert a trained pipeline into an ONNX Runtime session for faster inference."""
+    # Columns one-hot encoded from strings are fed as string tensors, the rest as floats
+    string_columns = set()
+    preprocessor = getattr(component_model, 'named_steps', {}).get('preprocessor')
+    for _, transformer, columns in getattr(preprocessor, 'transformers_', []):
+        if any(categories.dtype == object for categories in getattr(transformer, 'categories_', [])):
+            string_columns.update(columns)
+    
+    initial_types = [
+        (col, StringTensorType([None, 1]) if col in string_columns else FloatTensorType([None, 1]))
+        for col in component_model.feature_names_in_
+    ]
+    
+    onnx_model = convert_sklearn(component_model, initial_types=initial_types, options={'zipmap': False})
+    
+    sess_options = ort.SessionOptions()
+    sess_options.intra_op_num_threads = 1
+    return ort.InferenceSession(
+        onnx_model.SerializeToString(),
+        sess_options=sess_options,
+        providers=['CPUExecutionProvider']
+    )
+
+# Build ONNX Runtime inputs for a vehicle
+def build_onnx_feed(session, vehicle_data):
+    """Build the ONNX Runtime input feed for a vehicle, defaulting missing features to 0."""
+    feed = {}
+    for onnx_input in session.get_inputs():
+        value = vehicle_data.get(onnx_input.name, 0)
+        if onnx_input.type == 'tensor(string)':
+            feed[onnx_input.name] = np.array([[str(value)]], dtype=object)
+        else:
+            feed[onnx_input.name] = np.array([[value]], dtype=np.float32)
+    return feed
+
+# Build a feature aligner for a model
+def make_feature_aligner(features):
+    """Build a function that projects an input row dict onto the given feature order."""
+    getter = operator.itemgetter(*features)
+    if len(features) == 1:
+        # itemgetter returns a bare value for a single key
+        return lambda row: (getter(row),)
+    return getter
+
 # Load models at startup
 models = load_models()
 
+# Cache each model's expected input columns once so predictions don't re-read
+# feature_names_in_ on every request
+MODEL_FEATURES = {
+    component_name: tuple(getattr(component_model, 'feature_names_in_', ()))
+    for component_name, component_model in models.items()
+}
+
+# Default value (0) for every feature any model expects
+MODEL_FEATURE_DEFAULTS = dict.fromkeys(
+    (col for features in MODEL_FEATURES.values() for col in features), 0
+)
+
+# Project an input row onto each model's feature order
+MODEL_ALIGNERS = {
+    component_name: make_feature_aligner(features)
+    for component_name, features in MODEL_FEATURES.items()
+    if features
+}
+
+# ONNX Runtime sessions for models that could be compiled
+MODEL_SESSIONS = {}
+if onnx_available:
+    for component_name, component_model in models.items():
+        try:
+            MODEL_SESSIONS[component_name] = compile_model_to_onnx(component_model)
+            print(f"Compiled ONNX model for {component_name}")
+        except Exception as e:
+            print(f"Error compiling ONNX model for {component_name}, using scikit-learn: {str(e)}")
+
+# Fetch embeddings for normalized text, cached so repeat queries skip the API
+@functools.lru_cache(maxsize=4096)
+def _get_embedding_cached(text, model):
+    """Get embedding for normalized text using OpenAI's API, as a tuple for caching."""
+    response = client.embeddings.create(
+        input=[text],
+        model=model
+    )
+    
+    return tuple(response.data[0].embedding)
+
 # Get embedding for text
 def get_embedding(text, model=EMBEDDING_MODEL):
     """Get embedding for a text using OpenAI's API."""
     try:
-        # Replace newlines with spaces
-        text = text.replace("\n", " ")
+        # Replace newlines with spaces and normalize so equivalent queries share a cache entry
+        text = text.replace("\n", " ").strip().lower()
         
+        # Return the embedding vector
+        return list(_get_embedding_cached(text, model))
+    except Exception as e:
+        print(f"Error getting embedding: {str(e)}")
+        return None
+
+# Get embeddings for several texts
+def get_embeddings_batch(texts, model=EMBEDDING_MODEL):
+    """Get embeddings for several texts in a single OpenAI API call."""
+    if not texts:
+        return []
+    
+    try:
         response = client.embeddings.create(
-            input=[text],
+            input=[text.replace("\n", " ") for text in texts],
             model=model
         )
         
-        # Return the embedding vector
-        return response.data[0].embedding
+        # Return the embedding vectors in input order
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
     except Exception as e:
-        print(f"Error getting embedding: {str(e)}")
+        print(f"Error getting embeddings: {str(e)}")
         return None
 
 # Search for parts
-def search_parts(query, threshold=0.5, limit=5):
+def search_parts(query, threshold=0.5, limit=5, query_embedding=None):
     """Search for parts using semantic similarity."""
     try:
-        # Get embedding for the query
-        query_embedding = get_embedding(query)
+        # Get embedding for the query, unless the caller already embedded it in a batch
+        if query_embedding is None:
+            query_embedding = get_embedding(query)
         if not query_embedding:
             return []
         
@@ -124,34 +266,72 @@ def search_parts(query, threshold=0.5, limit=5):
         print(f"Error searching parts: {str(e)}")
         return []
 
-# Get parts for a vehicle component
-def get_parts_for_vehicle_component(make, model, year, component_name):
-    """Get parts for a specific vehicle type and component."""
+# Search for parts matching several queries
+def search_parts_batch(queries, threshold=0.5, limit=5):
+    """Search for parts for several queries, embedding all of them in a single OpenAI API call."""
+    # Normalize like get_embedding, so a query gets the same embedding either way
+    embeddings = get_embeddings_batch([query.replace("\n", " ").strip().lower() for query in queries])
+    if embeddings is None:
+        return [[] for _ in queries]
+    
+    return [search_parts(query, threshold, limit, query_embedding=embedding)
+            for query, embedding in zip(queries, embeddings)]
+
+# Get parts for several components of a vehicle
+def get_parts_for_vehicle_components(make, model, year, component_names):
+    """Get parts for a specific vehicle type and several components in one round-trip."""
+    parts_by_component = {component_name: [] for component_name in component_names}
+    
+    if not component_names:
+        return parts_by_component
+    
     try:
-        # Get vehicle type ID
-        vehicle_type_response = supabase.table('vehicle_types').select('type_id').eq('make', make).eq('model', model).eq('year', year).execute()
-        
-        if not vehicle_type_response.data:
-            return []
-        
-        type_id = vehicle_type_response.data[0]['type_id']
-        
-        # Get component ID
-        component_response = supabase.table('components').select('component_id').eq('component_name', component_name).execute()
+        # Join vehicle types, components and parts server-side
+        response = supabase.rpc(
+            'match_parts_for_components',
+            {
+                'make': make,
+                'model': model,
+                'year': year,
+                'component_names': list(component_names)
+            }
+        ).execute()
         
-        if not component_response.data:
-            return []
+        for row in response.data:
+            parts_by_component.setdefault(row['component_name'], []).append(row['part'])
+    
+    except Exception as e:
+        print(f"Error getting parts: {str(e)}")
+    
+    return parts_by_component
+
+# Predict the failure probability for a single component
+def predict_component_failure(component_name, component_model, input_row, model_inputs):
+    """Predict the failure probability for one component, or None if prediction fails."""
+    try:
+        features = MODEL_FEATURES.get(component_name)
+        session = MODEL_SESSIONS.get(component_name)
         
-        component_id = component_response.data[0]['component_id']
+        # Models with the same feature layout and runtime share one input
+        input_key = (features, session is not None)
+        model_input = model_inputs.get(input_key)
+        if model_input is None:
+            if session is not None:
+                model_input = build_onnx_feed(session, input_row)
+            elif features:
+                model_input = pd.DataFrame([MODEL_ALIGNERS[component_name](input_row)], columns=list(features))
+            else:
+                model_input = pd.DataFrame([input_row])
+            model_inputs[input_key] = model_input
         
-        # Get parts
-        parts_response = supabase.table('parts').select('*').eq('type_id', type_id).eq('component_id', component_id).execute()
+        if session is not None:
+            # Outputs are (labels, probabilities)
+            return session.run(None, model_input)[1][0][1]
         
-        return parts_response.data
-    
+        return component_model.predict_proba(model_input)[0][1]
     except Exception as e:
-        print(f"Error getting parts: {str(e)}")
-        return []
+        print(f"Error predicting for {component_name}: {str(e)}")
+        return None
 
 # Predict component failures for a vehicle
 def predict_vehicle_failures(vehicle_data, threshold=0.1):
@@ -160,66 +340,62 @@ def predict_vehicle_failures(vehicle_data, threshold=0.1):
     model = vehicle_data.get('model', '')
     year = vehicle_data.get('year', 2020)
     
-    predictions = []
-    
-    for component_name, component_model in models.items():
-        # Predict failure probability
-        try:
-            # Create a DataFrame with the vehicle data
-            vehicle_df = pd.DataFrame([vehicle_data])
-            
-            # Ensure all required columns exist
-            required_columns = component_model.feature_names_in_
-            for col in required_columns:
-                if col not in vehicle_df.columns:
-                    vehicle_df[col] = 0  # Default value for missing features
-            
-            # Make prediction
-            prob = component_model.predict_proba(vehicle_df)[0][1]
-            
-            # Get parts for this component if probability is above threshold
-            parts = []
-            if prob >= threshold and make and model and year:
-                parts = get_parts_for_vehicle_component(make, model, year, component_name)
-            
-            predictions.append({
-                'component': component_name,
-                'probability': prob,
-                'parts': parts
-            })
-        except Exception as e:
-            print(f"Error predicting for {component_name}: {str(e)}")
-            predictions.append({
-                'component': component_name,
-                'probability': 0,
-                'parts': []
-            })
+    # Missing features default to 0
+    input_row = {**MODEL_FEATURE_DEFAULTS, **vehicle_data}
+    
+    # Predict failure probabilities for all components concurrently
+    component_names = list(models)
+    model_inputs = {}
+    probabilities = list(prediction_executor.map(
+        lambda name: predict_component_failure(name, models[name], input_row, model_inputs),
+        component_names
+    ))
+    
+    # Fetch parts for all components above the threshold in one call
+    parts_by_component = {}
+    if make and model and year:
+        flagged = [
+            name for name, prob in zip(component_names, probabilities)
+            if prob is not None and prob >= threshold
+        ]
+        parts_by_component = get_parts_for_vehicle_components(make, model, year, flagged)
+    
+    predictions = [
+        {
+            'component': component_name,
+            'probability': prob if prob is not None else 0,
+            'parts': parts_by_component.get(component_name, [])
+        }
+        for component_name, prob in zip(component_names, probabilities)
+    ]
     
     # Sort by probability (highest first)
     predictions.sort(key=lambda x: x['probability'], reverse=True)
     
     return predictions
 
+# Parse the demand forecast CSV once per file version
+@functools.lru_cache(maxsize=1)
+def _load_demand_forecast_cached(csv_path, mtime):
+    """Load the demand forecast CSV, cached by path and modification time."""
+    print(f"Loading demand forecast from CSV: {csv_path}")
+    df = pd.read_csv(csv_path)
+    print(f"Loaded {len(df)} rows from CSV")
+    return df
+
 # Load demand forecast
 def load_demand_forecast():
     """Load demand forecast from CSV file or generate sample data if file not found."""
     try:
         csv_path = os.path.abspath('demand_forecast.csv')
-        print(f"Looking for demand forecast CSV at: {csv_path}")
-        print(f"File exists: {os.path.exists(csv_path)}")
         
         if os.path.exists(csv_path):
-            print(f"Loading demand forecast from CSV: {csv_path}")
-            df = pd.read_csv(csv_path)
-            print(f"Loaded {len(df)} rows from CSV")
-            return df
+            # The cached DataFrame is shared between requests; copy before mutating
+            return _load_demand_forecast_cached(csv_path, os.stat(csv_path).st_mtime)
         else:
             print("Demand forecast CSV not found, generating sample data")
-            # Set a fixed seed for random number generation to ensure consistent values
-            random.seed(42)
-            
-            # Generate sample data
-            sample_data = []
+            # Use a fixed seed for random number generation to ensure consistent values
+            rng = np.random.default_rng(42)
             
             # Sample vehicle types
             vehicle_types = [
@@ -263,88 +439,154 @@ def load_demand_forecast():
                 "Steering System": ["Power Steering Pump", "Steering Rack", "Tie Rod Ends", "Steering Column"]
             }
             
-            # Generate 50 sample parts with realistic data
-            part_id = 1
-            for vehicle_type in vehicle_types:
-                for component in random.sample(components, 5):  # Each vehicle type needs parts from 5 random components
-                    for part_type in random.sample(part_types[component], 2):  # 2 random parts per component
-                        # Generate realistic demand and stock numbers
-                        expected_demand = random.randint(50, 500)
-                        recommended_stock = int(expected_demand * random.uniform(0.8, 1.2))  # Stock is roughly based on demand
-                        
-                        # Generate realistic price based on component type
-                        base_price = 0
-                        if component == "Braking System":
-                            base_price = random.uniform(45.0, 115.0)
-                        elif component == "Engine":
-                            base_price = random.uniform(75.0, 225.0)
-                        elif component == "Transmission":
-                            base_price = random.uniform(120.0, 300.0)
-                        elif component == "Suspension":
-                            base_price = random.uniform(80.0, 400.0)
-                        elif component == "Electrical System":
-                            base_price = random.uniform(40.0, 200.0)
-                        elif component == "Cooling System":
-                            base_price = random.uniform(50.0, 150.0)
-                        elif component == "Fuel System":
-                            base_price = random.uniform(60.0, 180.0)
-                        elif component == "Exhaust System":
-                            base_price = random.uniform(100.0, 300.0)
-                        elif component == "HVAC System":
-                            base_price = random.uniform(80.0, 250.0)
-                        elif component == "Steering System":
-                            base_price = random.uniform(70.0, 220.0)
-                        else:
-                            base_price = random.uniform(50.0, 150.0)
-                        
-                        # Calculate different price points
-                        wholesale_price = base_price * 1.2  # 20% markup
-                        retail_price = base_price * 1.5     # 50% markup
-                        msrp = base_price * 2.0             # 100% markup
-                        
-                        # Create part entry
-                        part = {
-                            "part_id": part_id,
-                            "part_name": f"{part_type} - {vehicle_type}",
-                            "part_number": f"P{part_id:04d}-{random.randint(1000, 9999)}",
-                            "component_name": component,
-                            "vehicle_type": vehicle_type,
-                            "expected_demand": expected_demand,
-                            "recommended_stock": recommended_stock,
-                            "base_price": round(base_price, 2),
-                            "wholesale_price": round(wholesale_price, 2),
-                            "retail_price": round(retail_price, 2),
-                            "msrp": round(msrp, 2)
-                        }
-                        
-                        sample_data.append(part)
-                        part_id += 1
+            # Base price range for each component, aligned with the components list
+            component_price_ranges = np.array([
+                [45.0, 115.0],   # Braking System
+                [75.0, 225.0],   # Engine
+                [120.0, 300.0],  # Transmission
+                [80.0, 400.0],   # Suspension
+                [40.0, 200.0],   # Electrical System
+                [50.0, 150.0],   # Cooling System
+                [60.0, 180.0],   # Fuel System
+                [100.0, 300.0],  # Exhaust System
+                [80.0, 250.0],   # HVAC System
+                [70.0, 220.0]    # Steering System
+            ])
+            
+            # Each vehicle type needs parts from 5 random components, 2 random parts per component
+            n_vehicles = len(vehicle_types)
+            component_codes = rng.permuted(np.tile(np.arange(len(components)), (n_vehicles, 1)), axis=1)[:, :5]
+            part_choices = rng.permuted(np.tile(np.arange(4), (component_codes.size, 1)), axis=1)[:, :2]
             
-            return pd.DataFrame(sample_data)
+            # Flatten to one entry per generated part
+            vehicle_codes = np.repeat(np.arange(n_vehicles), 10)
+            component_codes = np.repeat(component_codes.ravel(), 2)
+            part_choices = part_choices.ravel()
+            n_parts = len(vehicle_codes)
+            part_ids = np.arange(1, n_parts + 1)
+            
+            # Generate realistic demand and stock numbers
+            # Stock is roughly based on demand
+            expected_demand = rng.integers(50, 501, n_parts)
+            recommended_stock = (expected_demand * rng.uniform(0.8, 1.2, n_parts)).astype(int)
+            
+            # Generate realistic price based on component type
+            base_price = rng.uniform(component_price_ranges[component_codes, 0], component_price_ranges[component_codes, 1])
+            
+            # Calculate different price points
+            wholesale_price = base_price * 1.2  # 20% markup
+            retail_price = base_price * 1.5     # 50% markup
+            msrp = base_price * 2.0             # 100% markup
+            
+            component_names = pd.Series(np.array(components)[component_codes])
+            vehicle_names = pd.Series(np.array(vehicle_types)[vehicle_codes])
+            part_type_names = pd.Series([
+                part_types[component][choice]
+                for component, choice in zip(component_names, part_choices)
+            ])
+            part_suffixes = pd.Series(rng.integers(1000, 10000, n_parts)).astype(str)
+            
+            return pd.DataFrame({
+                "part_id": part_ids,
+                "part_name": part_type_names + " - " + vehicle_names,
+                "part_number": "P" + pd.Series(part_ids).astype(str).str.zfill(4) + "-" + part_suffixes,
+                "component_name": component_names,
+                "vehicle_type": vehicle_names,
+                "expected_demand": expected_demand,
+                "recommended_stock": recommended_stock,
+                "base_price": base_price.round(2),
+                "wholesale_price": wholesale_price.round(2),
+                "retail_price": retail_price.round(2),
+                "msrp": msrp.round(2)
+            })
     except Exception as e:
         print(f"Error loading demand forecast: {str(e)}")
         return pd.DataFrame()
 
+# Parse the regional demand CSV once per file version
+@functools.lru_cache(maxsize=1)
+def _load_regional_demand_cached(csv_path, mtime):
+    """Load the regional demand CSV, cached by path and modification time."""
+    print(f"Loading regional demand from CSV: {csv_path}")
+    # Fix numeric dtypes at load so requests can use the columns as-is
+    df = pd.read_csv(csv_path, dtype={
+        'demand_intensity': 'float64',
+        'longitude': 'float64',
+        'latitude': 'float64',
+        'part_id': 'int64'
+    })
+    print(f"Loaded {len(df)} rows from CSV")
+    
+    # Index by part_id so per-part filtering is an index lookup instead of a full scan
+    return df.set_index('part_id', drop=False).rename_axis(None).sort_index(kind='stable')
+
+# Ranking and base totals for the most recently summarized demand forecast
+_demand_summary_cache = (None, None)
+
+# Summarize a demand forecast
+def summarize_demand_forecast(demand_df):
+    """Rank parts by expected demand and total demand and revenue, reusing the result for the same forecast."""
+    global _demand_summary_cache
+    
+    cached_df, summary = _demand_summary_cache
+    if cached_df is demand_df:
+        return summary
+    
+    # Missing values count as zero, matching pandas' NaN-skipping sums
+    demand = demand_df['expected_demand'].to_numpy(dtype=np.float64, na_value=0.0)
+    
+    # Partially select the 20 largest demands in O(n), then order just those;
+    # missing values rank last, as they do in sort_values
+    ranking = demand_df['expected_demand'].to_numpy(dtype=np.float64, na_value=-np.inf)
+    top_n = min(20, len(ranking))
+    top_idx = np.argpartition(-ranking, top_n - 1)[:top_n] if top_n else np.empty(0, dtype=np.intp)
+    top_idx = top_idx[np.lexsort((top_idx, -ranking[top_idx]))]
+    
+    summary = {
+        'top_parts': demand_df.iloc[top_idx],
+        'demand': demand,
+        'retail_price': None,
+        'scaled_totals': {}
+    }
+    if 'retail_price' in demand_df.columns:
+        summary['retail_price'] = demand_df['retail_price'].to_numpy(dtype=np.float64, na_value=0.0)
+    
+    _demand_summary_cache = (demand_df, summary)
+    return summary
+
+# Total demand and revenue of a demand forecast scaled to a time window
+def scaled_demand_totals(summary, scaling_factor):
+    """Total the per-part demands rounded after scaling, so the totals match the rows shown, cached per factor."""
+    totals = summary['scaled_totals'].get(scaling_factor)
+    if totals is None:
+        scaled_demand = np.rint(summary['demand'] * scaling_factor)
+        
+        # A dot product sums demand * price in one pass without an intermediate column
+        revenue = None
+        if summary['retail_price'] is not None:
+            revenue = float(np.dot(scaled_demand, summary['retail_price']))
+        
+        totals = (int(scaled_demand.sum()), revenue)
+        summary['scaled_totals'][scaling_factor] = totals
+    
+    return totals
+
 # Load regional demand data from CSV
 def load_regional_demand():
     """Load regional demand data from CSV file or return empty DataFrame if file not found."""
     try:
         # Try both relative and absolute paths
         csv_path = os.path.abspath('generative_data/regional_demand.csv')
-        print(f"Looking for regional demand CSV at: {csv_path}")
-        print(f"File exists: {os.path.exists(csv_path)}")
+        app.logger.debug("Looking for regional demand CSV at %s (exists: %s)", csv_path, os.path.exists(csv_path))
         
         if not os.path.exists(csv_path):
             # Try alternative path
             csv_path = os.path.join(os.path.dirname(__file__), 'generative_data', 'regional_demand.csv')
-            print(f"Trying alternative path: {csv_path}")
-            print(f"File exists: {os.path.exists(csv_path)}")
+            app.logger.debug("Trying alternative path %s (exists: %s)", csv_path, os.path.exists(csv_path))
         
         if os.path.exists(csv_path):
-            print(f"Loading regional demand from CSV: {csv_path}")
-            df = pd.read_csv(csv_path)
-            print(f"Loaded {len(df)} rows from CSV")
-            return df
+            # The cached DataFrame is shared between requests; copy before mutating
+            return _load_regional_demand_cached(csv_path, os.stat(csv_path).st_mtime)
         else:
             print("Regional demand CSV not found")
             # Check if we have the CSV generation script and run it
@@ -359,9 +601,7 @@ def load_regional_demand():
                 # Check if file was created
                 if os.path.exists(csv_path):
                     print(f"CSV successfully generated, loading it now")
-                    df = pd.read_csv(csv_path)
-                    print(f"Loaded {len(df)} rows from CSV")
-                    return df
+                    return _load_regional_demand_cached(csv_path, os.stat(csv_path).st_mtime)
             
             print("Could not generate or find the regional demand data")
             return pd.DataFrame()
@@ -459,27 +699,32 @@ def predict_timeline():
         # Get threshold (default to 0.1)
         threshold = data.get('threshold', 0.1)
         
-        # Connect to Supabase
-        supabase = connect_to_supabase()
-        
-        # Calculate timeline predictions
+        # Calculate timeline predictions using the shared Supabase client
         if prediction_type == 'cumulative':
             timeline_predictions = calculate_cumulative_failure_timeline(models, vehicle_data, time_windows, supabase)
         else:
             timeline_predictions = predict_failure_timeline(models, vehicle_data, time_windows, supabase)
         
+        # Collect components above threshold in any time window
+        flagged = [
+            component_name
+            for component_name, predictions in timeline_predictions.items()
+            if any(prediction['probability'] >= threshold for prediction in predictions.values())
+        ]
+        
+        # Find parts for all of them in one call
+        parts_by_component = get_parts_for_vehicle_components(
+            vehicle_data['make'], 
+            vehicle_data['model'], 
+            vehicle_data['year'], 
+            flagged
+        )
+        
         # Add parts for components above threshold
         for component_name, predictions in timeline_predictions.items():
             for time_window, prediction in predictions.items():
                 if prediction['probability'] >= threshold:
-                    # Find parts for this component
-                    parts = get_parts_for_vehicle_component(
-                        vehicle_data['make'], 
-                        vehicle_data['model'], 
-                        vehicle_data['year'], 
-                        component_name
-                    )
-                    prediction['parts'] = parts
+                    prediction['parts'] = parts_by_component[component_name]
         
         # Return JSON response
         return jsonify(timeline_predictions)
@@ -492,33 +737,64 @@ def search():
     data = request.json
     
     # Validate input
-    if 'query' not in data:
+    if 'query' not in data and 'queries' not in data:
         return jsonify({'error': 'Missing required field: query'}), 400
     
     # Get parameters
-    query = data['query']
     threshold = float(data.get('threshold', 0.5))
     limit = int(data.get('limit', 5))
     
+    # Several queries are embedded together and return one result list per query
+    if 'queries' in data:
+        queries = data['queries']
+        if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+            return jsonify({'error': 'queries must be a list of strings'}), 400
+        if len(queries) > MAX_EMBEDDING_BATCH:
+            return jsonify({'error': f'At most {MAX_EMBEDDING_BATCH} queries can be searched per request'}), 400
+        
+        return jsonify(search_parts_batch(queries, threshold, limit))
+    
     # Search parts
-    results = search_parts(query, threshold, limit)
+    results = search_parts(data['query'], threshold, limit)
     
     return jsonify(results)
 
+@app.route('/api/embeddings/batch', methods=['POST'])
+def embeddings_batch():
+    """API endpoint for embedding several texts in one call."""
+    data = request.json
+    
+    # Validate input
+    if not data or 'texts' not in data:
+        return jsonify({'error': 'Missing required field: texts'}), 400
+    
+    texts = data['texts']
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return jsonify({'error': 'texts must be a list of strings'}), 400
+    
+    if len(texts) > MAX_EMBEDDING_BATCH:
+        return jsonify({'error': f'At most {MAX_EMBEDDING_BATCH} texts can be embedded per request'}), 400
+    
+    # Embed all texts in one API call
+    embeddings = get_embeddings_batch(texts)
+    if embeddings is None:
+        return jsonify({'error': 'Failed to generate embeddings'}), 500
+    
+    return jsonify({'embeddings': embeddings})
+
 @app.route('/api/demand', methods=['GET'])
 def get_demand():
     """API endpoint for getting demand forecasts by time window."""
     global CACHED_TOTAL_INVENTORY
     
-    print("\n--- GET /api/demand ---")
-    print(f"Request headers: {dict(request.headers)}")
-    print(f"Request remote addr: {request.remote_addr}")
-    print(f"Request method: {request.method}")
-    print(f"Request args: {dict(request.args)}")
+    # Request diagnostics are only logged when debug logging is enabled
+    logger = app.logger
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("GET /api/demand from %s args=%s", request.remote_addr, request.args)
     
     # Get time window from query parameter (default to 6 months)
     time_window = request.args.get('time_window', '6 months')
-    print(f"Requested time window: {time_window}")
     
     # Extract the number and unit from the time window string
     try:
@@ -538,69 +814,63 @@ def get_demand():
         else:
             # Default to 6 months if format is incorrect
             days = 180
-        
-        print(f"Converted time window to {days} days")
     except (ValueError, IndexError):
         # Default to 6 months if parsing fails
         days = 180
-        print(f"Failed to parse time window, using default: {days} days")
+    
+    if debug:
+        logger.debug("Time window %r converted to %d days", time_window, days)
     
     # Load demand forecast
     demand_df = load_demand_forecast()
     
     if demand_df.empty:
-        print("No demand data found, returning empty response")
-        response = jsonify({
+        logger.warning("No demand data found, returning empty response")
+        empty_data = {
             'time_window': time_window,
-            'parts': [],
             'total_demand': 0,
             'total_stock': 0
-        })
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response
-    
-    print(f"Loaded demand data with {len(demand_df)} rows")
+        }
+        if _wants_ndjson():
+            return _ndjson_response(empty_data, [])
+        return _json_response({**empty_data, 'parts': []})
     
     # Calculate the total inventory value only once and cache it
     if CACHED_TOTAL_INVENTORY is None:
         CACHED_TOTAL_INVENTORY = int(demand_df['recommended_stock'].sum())
-        print(f"Calculated and cached total inventory: {CACHED_TOTAL_INVENTORY}")
-    else:
-        print(f"Using cached total inventory: {CACHED_TOTAL_INVENTORY}")
+        logger.debug("Calculated and cached total inventory: %d", CACHED_TOTAL_INVENTORY)
     
-    # Create a copy of the DataFrame to avoid modifying the original
-    scaled_df = demand_df.copy()
+    # Reuse the ranking and base totals computed for this forecast
+    summary = summarize_demand_forecast(demand_df)
     
     # Base forecast is for 6 months (180 days), scale to the requested time window
     # Calculate scaling factor based on the ratio of requested days to base days (180)
+    # Negative windows scale demand down to zero
     base_days = 180  # 6 months
-    scaling_factor = days / base_days
-    print(f"Scaling factor: {scaling_factor} (requested {days} days / base {base_days} days)")
-    
-    # Only scale the expected demand values - inventory remains constant
-    scaled_df['expected_demand'] = (scaled_df['expected_demand'] * scaling_factor).round().astype(int)
-    
-    # Ensure we don't have negative values after scaling
-    scaled_df['expected_demand'] = scaled_df['expected_demand'].clip(lower=0)
+    scaling_factor = max(days / base_days, 0)
     
-    # Sort by the scaled expected demand and take top parts
-    top_parts_df = scaled_df.sort_values(by='expected_demand', ascending=False).head(20)
+    # Scaling by a non-negative factor preserves the ranking, so only the
+    # precomputed top parts need scaling - inventory remains constant
+    base_top_parts = summary['top_parts']
+    top_parts_df = base_top_parts.assign(
+        expected_demand=np.rint(base_top_parts['expected_demand'].to_numpy(dtype=np.float64) * scaling_factor).astype(np.int64)
+    )
     
-    # Calculate total demand from the scaled data for the selected top parts
-    total_demand = scaled_df['expected_demand'].sum()
+    # Total the scaled, rounded demand of every part, and each part's scaled demand times its retail price
+    total_demand, scaled_revenue = scaled_demand_totals(summary, scaling_factor)
     
     # Calculate potential revenue based on actual part prices
-    # Multiply each part's expected demand by its retail price
     potential_revenue = 0
-    if 'retail_price' in scaled_df.columns:
-        potential_revenue = (scaled_df['expected_demand'] * scaled_df['retail_price']).sum()
+    if scaled_revenue is not None:
+        potential_revenue = scaled_revenue
     else:
         # Fallback to a simple calculation if retail price is not available
         potential_revenue = total_demand * 50  # Assume average price of $50
     
     # Convert DataFrame to dict
     top_parts = top_parts_df.to_dict('records')
-    print(f"Returning top {len(top_parts)} parts")
+    if debug:
+        logger.debug("Returning top %d of %d parts (scaling factor %.3f)", len(top_parts), len(demand_df), scaling_factor)
     
     # Create response data
     response_data = {
@@ -611,93 +881,117 @@ def get_demand():
         'potential_revenue': round(potential_revenue, 2)  # Include the calculated potential revenue
     }
     
-    # Convert NumPy types to Python native types
-    response_data = convert_numpy_types(response_data)
-    
-    # Create response
-    response = jsonify(response_data)
+    # Stream a header object followed by one object per part when NDJSON is requested
+    if _wants_ndjson():
+        header = {key: value for key, value in response_data.items() if key != 'parts'}
+        return _ndjson_response(header, top_parts)
     
-    # Add CORS headers
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,OPTIONS')
-    
-    return response
+    # Create response with CORS headers
+    return _json_response(response_data)
 
 @app.route('/api/regional_demand', methods=['GET'])
 def get_regional_demand():
     """API endpoint for getting regional demand data for heatmap visualization."""
-    print("\n--- GET /api/regional_demand ---")
-    print(f"Request args: {dict(request.args)}")
-    print(f"Request headers: {dict(request.headers)}")
+    # Request diagnostics are only logged when debug logging is enabled; headers are never logged
+    logger = app.logger
+    logger.debug("GET /api/regional_demand from %s args=%s", request.remote_addr, request.args)
     
     # Get parameters
     time_window = request.args.get('time_window', '6 months')
     part_id = request.args.get('part_id')
     
-    print(f"Requested time window: {time_window}")
     if part_id:
-        print(f"Requested part_id: {part_id}")
         try:
             part_id = int(part_id)
         except ValueError:
-            print(f"Invalid part_id: {part_id}")
+            logger.warning("Invalid part_id: %s", part_id)
             part_id = None
     
     # Load regional demand data
     regional_df = load_regional_demand()
     
     if regional_df.empty:
-        print("No regional demand data found, returning empty response")
-        response = jsonify({
+        logger.warning("No regional demand data found, returning empty response")
+        return _json_response({
             'success': False,
             'error': 'No regional demand data available',
             'features': []
         })
-        # Add CORS headers
-        return _add_cors_headers(response)
     
     # Filter by part_id if provided
     if part_id:
-        regional_df = regional_df[regional_df['part_id'] == part_id]
-        print(f"Filtered to {len(regional_df)} rows for part_id {part_id}")
+        if part_id in regional_df.index:
+            regional_df = regional_df.loc[[part_id]]
+        else:
+            regional_df = regional_df.iloc[0:0]
+        logger.debug("Filtered to %d rows for part_id %s", len(regional_df), part_id)
     
     # Convert to GeoJSON format for the heatmap
-    features = []
-    for _, row in regional_df.iterrows():
-        feature = {
+    intensities = regional_df['demand_intensity'].tolist()
+    coordinates = regional_df[['longitude', 'latitude']].to_numpy().tolist()
+    labels = regional_df[['city', 'state', 'part_name', 'component_name']].itertuples(index=False, name=None)
+    features = [
+        {
             'type': 'Feature',
             'properties': {
-                'intensity': float(row['demand_intensity']),
-                'city': row['city'],
-                'state': row['state'],
-                'part_name': row['part_name'],
-                'component_name': row['component_name']
+                'intensity': intensity,
+                'city': city,
+                'state': state,
+                'part_name': part_name,
+                'component_name': component_name
             },
             'geometry': {
                 'type': 'Point',
-                'coordinates': [float(row['longitude']), float(row['latitude'])]
+                'coordinates': coordinate
             }
         }
-        features.append(feature)
+        for intensity, (city, state, part_name, component_name), coordinate
+        in zip(intensities, labels, coordinates)
+    ]
     
-    print(f"Returning {len(features)} GeoJSON features")
+    logger.debug("Returning %d GeoJSON features for time window %r", len(features), time_window)
     
-    response = jsonify({
+    return _json_response({
         'success': True,
         'features': features
     })
-    
-    # Add CORS headers
-    return _add_cors_headers(response)
 
 # Helper function to add CORS headers
 def _add_cors_headers(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.extend(CORS_HEADERS)
     return response
 
+# Helper function to serialize data to JSON bytes
+def _dump_json(data):
+    if orjson_available:
+        # orjson serializes NumPy scalars and arrays natively
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    # Convert NumPy types to Python native types
+    return json.dumps(convert_numpy_types(data)).encode()
+
+# Helper function to build a JSON response with CORS headers
+def _json_response(data):
+    if orjson_available:
+        response = Response(_dump_json(data), mimetype='application/json')
+    else:
+        response = jsonify(convert_numpy_types(data))
+    return _add_cors_headers(response)
+
+# Helper function to check whether the client asked for NDJSON
+def _wants_ndjson():
+    return (request.args.get('format') == 'ndjson'
+            or request.accept_mimetypes.best == 'application/x-ndjson')
+
+# Helper function to stream a header object and records as NDJSON with CORS headers
+def _ndjson_response(header, records):
+    def generate():
+        yield _dump_json(header) + b'\n'
+        for record in records:
+            yield _dump_json(record) + b'\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    return _add_cors_headers(response)
+
 # Chat routes
 @app.route('/chat-frame')
 def chat_frame():
@@ -776,12 +1070,7 @@ def chat_realtime():
 def handle_preflight():
     """Handle preflight OPTIONS requests for CORS."""
     if request.method == "OPTIONS":
-        print(f"Handling OPTIONS preflight request from {request.remote_addr}")
-        response = make_response()
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-        response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,DELETE,OPTIONS')
-        return response
+        return Response(status=204, headers=CORS_HEADERS)
 
 if __name__ == '__main__':
     port = int(os.getenv("FLASK_PORT", 5001))  # Use FLASK_PORT from .env, fallback to 5001
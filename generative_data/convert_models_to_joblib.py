@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Model Conversion Script for Component Failure Models
+
+This script re-saves pickled component models as uncompressed joblib dumps so
+the app can memory-map their numpy arrays and share them across workers.
+"""
+
+import os
+import pickle
+import joblib
+
+# Directory where models are stored
+MODELS_DIR = 'models'
+
+def convert_models():
+    """
+    Convert all pickled component models in place.
+    
+    Returns:
+        int: Number of converted models
+    """
+    converted = 0
+    
+    # Check if models directory exists
+    if not os.path.exists(MODELS_DIR):
+        print(f"Error: Models directory '{MODELS_DIR}' not found.")
+        return converted
+    
+    for filename in os.listdir(MODELS_DIR):
+        if filename.endswith('_model.pkl'):
+            model_path = os.path.join(MODELS_DIR, filename)
+            
+            try:
+                with open(model_path, 'rb') as f:
+                    model = pickle.load(f)
+                
+                joblib.dump(model, model_path, compress=0)
+                converted += 1
+                print(f"Converted {filename}")
+            except Exception as e:
+                print(f"Error converting {filename}: {str(e)}")
+    
+    return converted
+
+def main():
+    """Main function to convert component models."""
+    converted = convert_models()
+    print(f"\nConverted {converted} models to joblib format")
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ to create a dataset for the prediction and optimization system.
 
 import argparse
 import os
+import sys
 import pandas as pd
 from utils.data_generation import generate_all_data, save_data
 
@@ -34,23 +35,27 @@ def main():
     # Generate all data
     data_dict = generate_all_data(n_types=args.n_types, n_vehicles=args.n_vehicles)
 
-    # Print summary statistics
+    # Print summary statistics, writing each dataset's summary in one call
     for name, df in data_dict.items():
-        print(f"\nSummary of {name} dataset:")
-        print(f"  - Shape: {df.shape}")
-        print(f"  - Columns: {', '.join(df.columns)}")
+        lines = [
+            f"\nSummary of {name} dataset:",
+            f"  - Shape: {df.shape}",
+            f"  - Columns: {', '.join(df.columns)}"
+        ]
         
-        # Print specific info based on data type
+        # Add specific info based on data type
         if name == 'vehicle_types':
             make_counts = df['make'].value_counts()
-            print(f"  - Makes count: {dict(make_counts.head(3))}")
-            print(f"  - Year range: {df['year'].min()} to {df['year'].max()}")
+            lines.append(f"  - Makes count: {dict(make_counts.head(3))}")
+            lines.append(f"  - Year range: {df['year'].min()} to {df['year'].max()}")
         
         elif name == 'vehicles':
-            print(f"  - Mileage stats: min={df['mileage'].min()}, max={df['mileage'].max()}, mean={df['mileage'].mean():.1f}")
+            lines.append(f"  - Mileage stats: min={df['mileage'].min()}, max={df['mileage'].max()}, mean={df['mileage'].mean():.1f}")
         
         elif name == 'failures':
-            print(f"  - Failure rate stats: min={df['failure_rate'].min():.3f}, max={df['failure_rate'].max():.3f}, mean={df['failure_rate'].mean():.3f}")
+            lines.append(f"  - Failure rate stats: min={df['failure_rate'].min():.3f}, max={df['failure_rate'].max():.3f}, mean={df['failure_rate'].mean():.3f}")
+        
+        sys.stdout.write('\n'.join(lines) + '\n')
 
     # Save all data to CSV files
     save_data(data_dict, args.output_dir)
@@ -8,6 +8,7 @@ It implements Step 2 of the project plan: Data Engineering with Supabase.
 
 import argparse
 import os
+import sys
 import pandas as pd
 from utils.database import connect_to_supabase, create_tables, load_data_from_csv, upload_data_to_supabase, sample_query
 
@@ -23,6 +24,8 @@ def main():
                         help='Skip confirmation before uploading data')
     parser.add_argument('--test_mode', action='store_true',
                         help='Run in test mode - only load data, skip Supabase connection')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print sample rows from each table')
     args = parser.parse_args()
 
     # Display header
@@ -41,15 +44,14 @@ def main():
         
         # Summarize data to be uploaded
         total_records = sum(len(df) for df in data_dict.values())
-        print(f"\nTotal records: {total_records}")
+        lines = [f"\nTotal records: {total_records}"]
         for table_name, df in data_dict.items():
-            print(f"  - {table_name}: {len(df)} records")
-            # Print sample data (first 3 rows)
-            if not df.empty:
-                print("    Sample data:")
-                sample = df.head(3).to_string(index=False)
-                for line in sample.split('\n'):
-                    print(f"      {line}")
+            lines.append(f"  - {table_name}: {len(df)} records")
+            # Add sample data (first 3 rows) as plain records, skipping pandas' table formatter
+            if args.verbose and not df.empty:
+                lines.append("    Sample data:")
+                lines.extend(f"      {record}" for record in df.head(3).to_dict('records'))
+        sys.stdout.write('\n'.join(lines) + '\n')
         
         # Stop here if in test mode
         if args.test_mode:
@@ -7,242 +7,448 @@ which will be used to create embeddings for semantic search.
 """
 
 import os
+import argparse
+import hashlib
 import pandas as pd
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from utils.database import connect_to_supabase
 
+# Optional pyarrow import for Parquet output and its C++ CSV writer
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+    pyarrow_available = True
+except ImportError:
+    pyarrow_available = False
 
-def generate_vehicle_type_descriptions(supabase):
-    """Generate descriptions for vehicle types."""
-    print("Generating descriptions for vehicle types...")
-    
-    # Fetch all vehicle types
-    response = supabase.table('vehicle_types').select('*').execute()
-    vehicle_types = response.data
+DESCRIPTIONS_DIR = 'data/descriptions'
+DESCRIPTION_CACHE_PATH = os.path.join(DESCRIPTIONS_DIR, '.cache.parquet')
+
+# Source tables and the primary key used to page through them in a stable order
+SOURCE_TABLES = {
+    'vehicle_types': 'type_id',
+    'components': 'component_id',
+    'parts': 'part_id',
+    'vehicles': 'vehicle_id'
+}
+
+# Description template filled directly from each vehicle_types row
+VEHICLE_TYPE_TEMPLATE = "{year} {make} {model} - A {make} vehicle manufactured in {year}."
+
+# Mileage thresholds and the description for each bucket they delimit
+MILEAGE_THRESHOLDS = [30000, 70000, 120000]
+MILEAGE_DESCRIPTIONS = ["low mileage", "moderate mileage", "high mileage", "very high mileage"]
+
+# Supabase caps responses at 1000 rows by default, so larger pages would be truncated
+DEFAULT_PAGE_SIZE = 1000
+FETCH_WORKERS = 8
+
+
+def fetch_page(supabase, table_name, order_column, offset, page_size, with_count=False):
+    """Fetch one page of rows from a table, optionally with the exact total row count."""
+    query = supabase.table(table_name).select('*', count='exact' if with_count else None)
+    return query.order(order_column).range(offset, offset + page_size - 1).execute()
+
+
+def fetch_source_tables(supabase, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Fetch every source table in pages, with all tables and pages requested concurrently.
     
-    descriptions = []
-    for vt in vehicle_types:
-        # Create a rich description
-        description = f"{vt['year']} {vt['make']} {vt['model']} - A {vt['make']} vehicle manufactured in {vt['year']}."
+    Args:
+        supabase: Supabase client
+        page_size: Number of rows requested per page
         
-        descriptions.append({
-            'type_id': vt['type_id'],
-            'description': description
+    Returns:
+        Dictionary mapping table name to its list of rows
+    """
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        # The first page of each table also reports how many pages remain
+        first_pages = {
+            table_name: executor.submit(fetch_page, supabase, table_name, order_column, 0, page_size, True)
+            for table_name, order_column in SOURCE_TABLES.items()
+        }
+        
+        page_futures = {}
+        for table_name, first_page in first_pages.items():
+            total_rows = first_page.result().count or 0
+            page_futures[table_name] = [first_page] + [
+                executor.submit(fetch_page, supabase, table_name, SOURCE_TABLES[table_name], offset, page_size)
+                for offset in range(page_size, total_rows, page_size)
+            ]
+        
+        tables = {}
+        for table_name, futures in page_futures.items():
+            tables[table_name] = [row for future in futures for row in future.result().data]
+            print(f"Fetched {len(tables[table_name])} rows from {table_name} in {len(futures)} page(s)")
+    
+    return tables
+
+
+def save_descriptions_csv(descriptions, path):
+    """Write a descriptions DataFrame to CSV, using pyarrow when available."""
+    if pyarrow_available and not descriptions.empty:
+        table = pa.Table.from_pandas(descriptions, preserve_index=False)
+        pacsv.write_csv(table, path, write_options=pacsv.WriteOptions(include_header=True))
+    else:
+        descriptions.to_csv(path, index=False)
+
+
+def save_descriptions(descriptions, name, output_format='parquet'):
+    """Write a descriptions DataFrame to data/descriptions/<name>.parquet or .csv and return the path."""
+    if output_format == 'parquet' and pyarrow_available:
+        # Many rows share identical text, so store string columns as dictionaries of distinct values
+        table = pa.Table.from_pandas(descriptions, preserve_index=False)
+        table = pa.table({
+            name: column.dictionary_encode()
+            if pa.types.is_string(column.type) or pa.types.is_large_string(column.type) else column
+            for name, column in zip(table.column_names, table.columns)
         })
+        path = os.path.join(DESCRIPTIONS_DIR, f"{name}.parquet")
+        pq.write_table(table, path, compression='zstd', use_dictionary=True)
+    else:
+        path = os.path.join(DESCRIPTIONS_DIR, f"{name}.csv")
+        save_descriptions_csv(descriptions, path)
+    return path
+
+
+def source_hash(*records):
+    """Hash the source rows a description is built from."""
+    payload = repr([sorted(record.items()) for record in records]).encode()
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def load_description_cache():
+    """Load cached descriptions as a dict keyed by (entity_type, entity_id)."""
+    if not pyarrow_available or not os.path.exists(DESCRIPTION_CACHE_PATH):
+        return {}
+    
+    try:
+        cache_df = pq.read_table(DESCRIPTION_CACHE_PATH).to_pandas()
+    except Exception as e:
+        print(f"Warning: Could not read description cache, regenerating all descriptions: {str(e)}")
+        return {}
+    
+    return {
+        (entity_type, entity_id): (src_hash, description)
+        for entity_type, entity_id, src_hash, description in cache_df.itertuples(index=False, name=None)
+    }
+
+
+def save_description_cache(cache):
+    """Persist the description cache next to the generated descriptions."""
+    if not pyarrow_available:
+        return
+    
+    entity_types, entity_ids = zip(*cache) if cache else ((), ())
+    src_hashes, descriptions = zip(*cache.values()) if cache else ((), ())
+    table = pa.table({
+        'entity_type': pa.array(entity_types, type=pa.string()),
+        'entity_id': pa.array(entity_ids, type=pa.string()),
+        'src_hash': pa.array(src_hashes, type=pa.string()),
+        'description': pa.array(descriptions, type=pa.string())
+    })
+    pq.write_table(table, DESCRIPTION_CACHE_PATH, compression='snappy')
+
+
+def generate_with_cache(cache, entity_type, rows, id_key, row_sources, generate):
+    """
+    Reuse cached descriptions for unchanged rows and generate only the rest.
+    
+    Args:
+        cache: Description cache from load_description_cache, updated in place
+        entity_type: Cache namespace for this kind of entity
+        rows: Source rows to describe
+        id_key: Name of the id column shared by the rows and the descriptions
+        row_sources: Function returning every source record a row's description depends on
+        generate: Generator function taking a list of rows and returning a descriptions DataFrame
+        
+    Returns:
+        DataFrame of ids and descriptions in the same order as rows
+    """
+    descriptions = {}
+    stale_rows = []
+    row_hashes = {}
+    
+    for row in rows:
+        key = (entity_type, str(row[id_key]))
+        row_hashes[key] = source_hash(*row_sources(row))
+        cached = cache.get(key)
+        if cached is not None and cached[0] == row_hashes[key]:
+            descriptions[key[1]] = cached[1]
+        else:
+            stale_rows.append(row)
+    
+    print(f"Reusing {len(descriptions)} cached {entity_type} descriptions, generating {len(stale_rows)}")
+    if stale_rows:
+        generated = generate(stale_rows)
+        descriptions.update(zip(map(str, generated[id_key].tolist()), generated['description'].tolist()))
+    
+    # Refresh this entity's cache entries, dropping rows that no longer exist
+    for key in [key for key in cache if key[0] == entity_type and key not in row_hashes]:
+        del cache[key]
+    for key, src_hash in row_hashes.items():
+        cache[key] = (src_hash, descriptions[key[1]])
+    
+    ids = [row[id_key] for row in rows]
+    return pd.DataFrame({id_key: ids, 'description': [descriptions[str(entity_id)] for entity_id in ids]})
+
+
+def generate_vehicle_type_descriptions(vehicle_types):
+    """Generate descriptions for vehicle types."""
+    print("Generating descriptions for vehicle types...")
+    
+    # Create a rich description with one template fill per vehicle type
+    descriptions = pd.DataFrame({
+        'type_id': [vt['type_id'] for vt in vehicle_types],
+        'description': [VEHICLE_TYPE_TEMPLATE.format_map(vt) for vt in vehicle_types]
+    })
     
     print(f"Generated {len(descriptions)} vehicle type descriptions")
     return descriptions
 
 
-def generate_component_descriptions(supabase):
+# Component descriptions with more detail, keyed by lowercase component name
+COMPONENT_DETAILS = {
+    'brakes': 'Braking system including brake pads, rotors, and calipers that slow or stop the vehicle.',
+    'batteries': 'Electrical storage system that provides power to start the engine and run vehicle electronics.',
+    'alternators': 'Charging system component that generates electricity to recharge the battery and power electrical systems.',
+    'spark plugs': 'Ignition system components that create the spark to ignite fuel in the engine cylinders.',
+    'tires': 'Rubber components that provide traction and cushioning between the vehicle and the road.',
+    'oil filters': 'Engine component that removes contaminants from engine oil to protect the engine.',
+    'air filters': 'Component that cleans air entering the engine to prevent damage from particles.',
+    'fuel pumps': 'Component that delivers fuel from the tank to the engine at the proper pressure.',
+    'radiators': 'Cooling system component that dissipates heat from engine coolant.',
+    'starters': 'Electrical motor that initiates engine operation when the vehicle is started.'
+}
+
+
+def build_components_frame(components):
+    """Build a components DataFrame with component names lowercased once for matching."""
+    comp_df = pd.DataFrame(components, columns=['component_id', 'component_name'])
+    comp_df['component_name_lower'] = comp_df['component_name'].str.lower()
+    return comp_df
+
+
+def generate_component_descriptions(components):
     """Generate descriptions for components."""
     print("Generating descriptions for components...")
     
-    # Fetch all components
-    response = supabase.table('components').select('*').execute()
-    components = response.data
-    
-    # Component descriptions with more detail
-    component_details = {
-        'brakes': 'Braking system including brake pads, rotors, and calipers that slow or stop the vehicle.',
-        'batteries': 'Electrical storage system that provides power to start the engine and run vehicle electronics.',
-        'alternators': 'Charging system component that generates electricity to recharge the battery and power electrical systems.',
-        'spark plugs': 'Ignition system components that create the spark to ignite fuel in the engine cylinders.',
-        'tires': 'Rubber components that provide traction and cushioning between the vehicle and the road.',
-        'oil filters': 'Engine component that removes contaminants from engine oil to protect the engine.',
-        'air filters': 'Component that cleans air entering the engine to prevent damage from particles.',
-        'fuel pumps': 'Component that delivers fuel from the tank to the engine at the proper pressure.',
-        'radiators': 'Cooling system component that dissipates heat from engine coolant.',
-        'starters': 'Electrical motor that initiates engine operation when the vehicle is started.'
-    }
+    if not components:
+        print("Generated 0 component descriptions")
+        return pd.DataFrame(columns=['component_id', 'description'])
     
-    descriptions = []
-    for comp in components:
-        component_name = comp['component_name'].lower()
-        # Use detailed description if available, otherwise create a generic one
-        if component_name in component_details:
-            description = component_details[component_name]
-        else:
-            description = f"Automotive {comp['component_name']} component for vehicle operation and maintenance."
-        
-        descriptions.append({
-            'component_id': comp['component_id'],
-            'description': description
-        })
+    comp_df = build_components_frame(components)
     
+    # Use detailed description if available, otherwise create a generic one
+    detailed = comp_df['component_name_lower'].map(COMPONENT_DETAILS)
+    generic = "Automotive " + comp_df['component_name'] + " component for vehicle operation and maintenance."
+    comp_df['description'] = detailed.where(detailed.notna(), generic)
+    
+    descriptions = comp_df[['component_id', 'description']]
     print(f"Generated {len(descriptions)} component descriptions")
     return descriptions
 
 
-def generate_part_descriptions(supabase):
-    """Generate descriptions for parts."""
+def lookup_by_id(values_by_id, ids, default):
+    """
+    Look up a value for every id, indexing a dense array when ids are small non-negative integers.
+    
+    Args:
+        values_by_id: Dictionary mapping id to value
+        ids: Series of ids to look up
+        default: Value used for ids missing from values_by_id
+        
+    Returns:
+        Series of looked-up values aligned with ids
+    """
+    keys = list(values_by_id)
+    dense = (
+        ids.dtype.kind in 'iu' and keys
+        and all(isinstance(key, (int, np.integer)) for key in keys)
+        and min(keys) >= 0 and max(keys) <= 4 * len(keys) + 1024
+    )
+    if not dense:
+        return ids.map(values_by_id).fillna(default)
+    
+    # Index a table laid out by id instead of hashing each id; the extra last slot holds the default
+    table = np.full(max(keys) + 2, default, dtype=object)
+    table[keys] = list(values_by_id.values())
+    id_array = ids.to_numpy()
+    missing_slot = len(table) - 1
+    positions = np.where((id_array >= 0) & (id_array < missing_slot), id_array, missing_slot)
+    return pd.Series(table[positions], index=ids.index, dtype=object)
+
+
+def format_vehicle_type_labels(vehicle_types):
+    """Format a 'year make model' label for each vehicle type in a lookup keyed by id."""
+    return {
+        type_id: f"{vt.get('year', 'N/A')} {vt.get('make', 'N/A')} {vt.get('model', 'N/A')}"
+        for type_id, vt in vehicle_types.items()
+    }
+
+
+def generate_part_descriptions(parts, vehicle_types, components):
+    """Generate descriptions for parts, given vehicle type and component lookups keyed by id."""
     print("Generating descriptions for parts...")
     
-    # Fetch all parts
-    parts_response = supabase.table('parts').select('*').execute()
-    parts = parts_response.data
+    if not parts:
+        print("Generated 0 part descriptions")
+        return pd.DataFrame(columns=['part_id', 'description'])
     
-    # Fetch all vehicle types for lookup
-    vt_response = supabase.table('vehicle_types').select('*').execute()
-    vehicle_types = {vt['type_id']: vt for vt in vt_response.data}
+    df = pd.DataFrame(parts, columns=['part_id', 'part_name', 'part_number', 'type_id', 'component_id'])
     
-    # Fetch all components for lookup
-    comp_response = supabase.table('components').select('*').execute()
-    components = {comp['component_id']: comp for comp in comp_response.data}
+    # Resolve related vehicle types and components column-wise by id
+    vehicle_labels = lookup_by_id(format_vehicle_type_labels(vehicle_types), df['type_id'], 'N/A N/A N/A')
+    component_names = lookup_by_id(
+        {component_id: comp.get('component_name', 'unknown') for component_id, comp in components.items()},
+        df['component_id'], 'unknown'
+    ).astype(str)
     
-    descriptions = []
-    for part in parts:
-        # Get related vehicle type and component
-        vt = vehicle_types.get(part['type_id'], {})
-        comp = components.get(part['component_id'], {})
-        
-        # Create a rich description
-        description = f"{part['part_name']} (Part #{part['part_number']}) - A {comp.get('component_name', 'unknown')} component "
-        description += f"designed for {vt.get('year', 'N/A')} {vt.get('make', 'N/A')} {vt.get('model', 'N/A')}. "
-        description += f"This part ensures optimal performance of the vehicle's {comp.get('component_name', 'unknown')} system."
-        
-        descriptions.append({
-            'part_id': part['part_id'],
-            'description': description
-        })
+    # Create a rich description
+    df['description'] = (
+        df['part_name'].astype(str) + " (Part #" + df['part_number'].astype(str) + ") - A "
+        + component_names + " component designed for " + vehicle_labels
+        + ". This part ensures optimal performance of the vehicle's " + component_names + " system."
+    )
     
+    descriptions = df[['part_id', 'description']]
     print(f"Generated {len(descriptions)} part descriptions")
     return descriptions
 
 
-def generate_vehicle_descriptions(supabase):
-    """Generate descriptions for individual vehicles."""
+def generate_vehicle_descriptions(vehicles, vehicle_types):
+    """Generate descriptions for individual vehicles, given a vehicle type lookup keyed by id."""
     print("Generating descriptions for vehicles...")
     
-    # Fetch all vehicles
-    vehicles_response = supabase.table('vehicles').select('*').execute()
-    vehicles = vehicles_response.data
+    if not vehicles:
+        print("Generated 0 vehicle descriptions")
+        return pd.DataFrame(columns=['vehicle_id', 'description'])
     
-    # Fetch all vehicle types for lookup
-    vt_response = supabase.table('vehicle_types').select('*').execute()
-    vehicle_types = {vt['type_id']: vt for vt in vt_response.data}
+    df = pd.DataFrame(vehicles, columns=['vehicle_id', 'type_id', 'mileage'])
     
-    descriptions = []
-    for vehicle in vehicles:
-        # Get related vehicle type
-        vt = vehicle_types.get(vehicle['type_id'], {})
-        
-        # Categorize mileage
-        mileage = vehicle['mileage']
-        if mileage < 30000:
-            mileage_desc = "low mileage"
-        elif mileage < 70000:
-            mileage_desc = "moderate mileage"
-        elif mileage < 120000:
-            mileage_desc = "high mileage"
-        else:
-            mileage_desc = "very high mileage"
-        
-        # Create a rich description
-        description = f"{vt.get('year', 'N/A')} {vt.get('make', 'N/A')} {vt.get('model', 'N/A')} with {mileage} miles. "
-        description += f"This is a {mileage_desc} vehicle that may require maintenance appropriate for its age and usage."
-        
-        descriptions.append({
-            'vehicle_id': vehicle['vehicle_id'],
-            'description': description
-        })
+    # Label each vehicle type once, then look the labels up for every vehicle
+    vehicle_labels = lookup_by_id(format_vehicle_type_labels(vehicle_types), df['type_id'], 'N/A N/A N/A')
+    
+    # Categorize mileage: below 30k is low, below 70k moderate, below 120k high
+    mileage_buckets = np.array(MILEAGE_DESCRIPTIONS, dtype=object)[
+        np.searchsorted(MILEAGE_THRESHOLDS, df['mileage'].to_numpy(), side='right')
+    ]
+    
+    # Create a rich description
+    df['description'] = (
+        vehicle_labels + " with " + df['mileage'].astype(str) + " miles. This is a "
+        + mileage_buckets + " vehicle that may require maintenance appropriate for its age and usage."
+    )
     
+    descriptions = df[['vehicle_id', 'description']]
     print(f"Generated {len(descriptions)} vehicle descriptions")
     return descriptions
 
 
-def generate_failure_descriptions(supabase):
+# Component-specific failure symptoms
+FAILURE_SYMPTOMS = {
+    'brakes': [
+        "Grinding noise when braking, reduced stopping power, and vibration in the brake pedal.",
+        "Squealing or squeaking sounds when applying brakes, especially at low speeds.",
+        "Soft or spongy brake pedal feel, requiring more distance to stop the vehicle.",
+        "Vehicle pulling to one side when braking, indicating uneven brake wear or hydraulic issues."
+    ],
+    'batteries': [
+        "Difficulty starting the vehicle, especially in cold weather, with slow cranking of the engine.",
+        "Electrical systems showing intermittent functionality, including dimming headlights.",
+        "Battery warning light illuminated on the dashboard, indicating charging system issues.",
+        "Corrosion visible on battery terminals, potentially causing poor electrical connections."
+    ],
+    'alternators': [
+        "Battery warning light on dashboard, combined with dimming headlights during operation.",
+        "Vehicle stalling unexpectedly or difficulty starting after being run for a period.",
+        "Whining or grinding noise from the front of the engine, indicating bearing failure.",
+        "Electrical accessories functioning poorly, especially when multiple systems are in use."
+    ],
+    'spark plugs': [
+        "Engine misfiring, rough idling, or hesitation during acceleration.",
+        "Decreased fuel efficiency and power, especially during acceleration.",
+        "Difficulty starting the engine, particularly in cold or damp conditions.",
+        "Check engine light illuminated, often accompanied by diagnostic codes for cylinder misfires."
+    ],
+    'tires': [
+        "Uneven tire wear patterns, indicating alignment or suspension issues.",
+        "Vibration felt through the steering wheel, especially at highway speeds.",
+        "Reduced traction in wet conditions, increasing stopping distance.",
+        "Visible damage to tire sidewalls or tread, including bulges, cuts, or excessive wear."
+    ],
+    'oil filters': [
+        "Decreased engine performance and power, especially under load.",
+        "Engine oil appearing dirty shortly after an oil change.",
+        "Metallic sounds from the engine, indicating potential internal damage.",
+        "Check engine light illuminated, potentially with oil pressure warning indicators."
+    ],
+    'air filters': [
+        "Reduced fuel economy and engine performance, especially during acceleration.",
+        "Black smoke from the exhaust, indicating improper air-fuel mixture.",
+        "Engine running rough or hesitating when accelerating.",
+        "Unusual engine sounds, particularly during changes in throttle position."
+    ],
+    'fuel pumps': [
+        "Engine sputtering at high speeds or under stress, indicating fuel delivery issues.",
+        "Difficulty starting the vehicle, with extended cranking before the engine fires.",
+        "Loss of power when accelerating or climbing hills, especially under load.",
+        "Whining noise from the rear of the vehicle, where the fuel tank is located."
+    ],
+    'radiators': [
+        "Engine overheating, especially in hot weather or during extended operation.",
+        "Sweet smell (from ethylene glycol) inside or around the vehicle.",
+        "Visible coolant leaks under the vehicle, often with a green, orange, or pink color.",
+        "White smoke from the exhaust, potentially indicating coolant entering the combustion chamber."
+    ],
+    'starters': [
+        "Clicking sound when turning the key, but engine fails to crank.",
+        "Grinding noise during starting, indicating gear engagement issues.",
+        "Starter continuing to run after the engine has started (starter drive not disengaging).",
+        "Intermittent starting issues, where the starter works occasionally but not consistently."
+    ]
+}
+
+# Flattened (component name, symptom) rows, joined against components by lowercased name
+_FAILURE_ROWS = [
+    (component_name, symptom)
+    for component_name, symptoms in FAILURE_SYMPTOMS.items()
+    for symptom in symptoms
+]
+_FAILURE_ROWS_DF = pd.DataFrame(_FAILURE_ROWS, columns=['component_name_lower', 'symptom_description'])
+
+# Generic symptoms for components without specific ones, as text around the component name
+_GENERIC_SYMPTOMS_DF = pd.DataFrame([
+    ("Unusual noises or performance issues related to the ", " system."),
+    ("Warning indicators on dashboard related to ", " functionality."),
+    ("Visible damage or wear to ", " components during inspection."),
+    ("Intermittent operation or failure of the ", " system.")
+], columns=['prefix', 'suffix'])
+
+
+def generate_failure_descriptions(components):
     """Generate descriptions for failure symptoms."""
     print("Generating descriptions for failure symptoms...")
     
-    # Component-specific failure symptoms
-    failure_symptoms = {
-        'brakes': [
-            "Grinding noise when braking, reduced stopping power, and vibration in the brake pedal.",
-            "Squealing or squeaking sounds when applying brakes, especially at low speeds.",
-            "Soft or spongy brake pedal feel, requiring more distance to stop the vehicle.",
-            "Vehicle pulling to one side when braking, indicating uneven brake wear or hydraulic issues."
-        ],
-        'batteries': [
-            "Difficulty starting the vehicle, especially in cold weather, with slow cranking of the engine.",
-            "Electrical systems showing intermittent functionality, including dimming headlights.",
-            "Battery warning light illuminated on the dashboard, indicating charging system issues.",
-            "Corrosion visible on battery terminals, potentially causing poor electrical connections."
-        ],
-        'alternators': [
-            "Battery warning light on dashboard, combined with dimming headlights during operation.",
-            "Vehicle stalling unexpectedly or difficulty starting after being run for a period.",
-            "Whining or grinding noise from the front of the engine, indicating bearing failure.",
-            "Electrical accessories functioning poorly, especially when multiple systems are in use."
-        ],
-        'spark plugs': [
-            "Engine misfiring, rough idling, or hesitation during acceleration.",
-            "Decreased fuel efficiency and power, especially during acceleration.",
-            "Difficulty starting the engine, particularly in cold or damp conditions.",
-            "Check engine light illuminated, often accompanied by diagnostic codes for cylinder misfires."
-        ],
-        'tires': [
-            "Uneven tire wear patterns, indicating alignment or suspension issues.",
-            "Vibration felt through the steering wheel, especially at highway speeds.",
-            "Reduced traction in wet conditions, increasing stopping distance.",
-            "Visible damage to tire sidewalls or tread, including bulges, cuts, or excessive wear."
-        ],
-        'oil filters': [
-            "Decreased engine performance and power, especially under load.",
-            "Engine oil appearing dirty shortly after an oil change.",
-            "Metallic sounds from the engine, indicating potential internal damage.",
-            "Check engine light illuminated, potentially with oil pressure warning indicators."
-        ],
-        'air filters': [
-            "Reduced fuel economy and engine performance, especially during acceleration.",
-            "Black smoke from the exhaust, indicating improper air-fuel mixture.",
-            "Engine running rough or hesitating when accelerating.",
-            "Unusual engine sounds, particularly during changes in throttle position."
-        ],
-        'fuel pumps': [
-            "Engine sputtering at high speeds or under stress, indicating fuel delivery issues.",
-            "Difficulty starting the vehicle, with extended cranking before the engine fires.",
-            "Loss of power when accelerating or climbing hills, especially under load.",
-            "Whining noise from the rear of the vehicle, where the fuel tank is located."
-        ],
-        'radiators': [
-            "Engine overheating, especially in hot weather or during extended operation.",
-            "Sweet smell (from ethylene glycol) inside or around the vehicle.",
-            "Visible coolant leaks under the vehicle, often with a green, orange, or pink color.",
-            "White smoke from the exhaust, potentially indicating coolant entering the combustion chamber."
-        ],
-        'starters': [
-            "Clicking sound when turning the key, but engine fails to crank.",
-            "Grinding noise during starting, indicating gear engagement issues.",
-            "Starter continuing to run after the engine has started (starter drive not disengaging).",
-            "Intermittent starting issues, where the starter works occasionally but not consistently."
-        ]
-    }
+    if not components:
+        print("Generated 0 failure symptom descriptions")
+        return pd.DataFrame(columns=['component_id', 'symptom_description'])
     
-    # Fetch all components
-    response = supabase.table('components').select('*').execute()
-    components = response.data
+    comp_df = build_components_frame(components)
+    comp_df['position'] = np.arange(len(comp_df))
     
-    descriptions = []
-    for comp in components:
-        component_name = comp['component_name'].lower()
-        
-        # Get symptoms for this component, or use generic ones
-        if component_name in failure_symptoms:
-            symptoms = failure_symptoms[component_name]
-        else:
-            symptoms = [
-                f"Unusual noises or performance issues related to the {component_name} system.",
-                f"Warning indicators on dashboard related to {component_name} functionality.",
-                f"Visible damage or wear to {component_name} components during inspection.",
-                f"Intermittent operation or failure of the {component_name} system."
-            ]
-        
-        # Create multiple descriptions for each component
-        for symptom in symptoms:
-            descriptions.append({
-                'component_id': comp['component_id'],
-                'symptom_description': symptom
-            })
+    # Join components to their specific symptoms
+    known = comp_df.merge(_FAILURE_ROWS_DF, on='component_name_lower', how='inner')
+    
+    # Use generic symptoms for any component without specific ones
+    unknown = comp_df[~comp_df['component_name_lower'].isin(FAILURE_SYMPTOMS)].merge(_GENERIC_SYMPTOMS_DF, how='cross')
+    unknown['symptom_description'] = unknown['prefix'] + unknown['component_name_lower'] + unknown['suffix']
+    
+    # Keep each component's symptoms together, in component order
+    symptoms_df = pd.concat([known, unknown], ignore_index=True).sort_values('position', kind='stable')
+    descriptions = symptoms_df[['component_id', 'symptom_description']].reset_index(drop=True)
     
     print(f"Generated {len(descriptions)} failure symptom descriptions")
     return descriptions
@@ -251,6 +457,15 @@ def generate_failure_descriptions(supabase):
 def main():
     """Main function to generate and store descriptions."""
     
+    parser = argparse.ArgumentParser(description='Generate entity descriptions for embedding')
+    parser.add_argument('--format', '-f', type=str, default='parquet', choices=['parquet', 'csv'],
+                        help='Output file format (csv is easier to review by hand)')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE,
+                        help='Rows fetched per Supabase request')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Regenerate every description instead of reusing unchanged ones')
+    args = parser.parse_args()
+    
     print("======== Automotive Description Generation ========")
     print("Connecting to Supabase...")
     
@@ -259,24 +474,58 @@ def main():
         supabase = connect_to_supabase()
         print("Connection successful!")
         
+        # Fetch each source table once and share it between the generators
+        print("Fetching source tables...")
+        tables = fetch_source_tables(supabase, page_size=args.page_size)
+        vehicle_types = tables['vehicle_types']
+        components = tables['components']
+        parts = tables['parts']
+        vehicles = tables['vehicles']
+        
+        # Build id lookups once for the part and vehicle generators
+        vehicle_types_by_id = {vt['type_id']: vt for vt in vehicle_types}
+        components_by_id = {comp['component_id']: comp for comp in components}
+        
+        # Descriptions are only regenerated for rows whose source data changed
+        cache = {} if args.no_cache else load_description_cache()
+        
         # Generate descriptions for each entity type
-        vehicle_type_descriptions = generate_vehicle_type_descriptions(supabase)
-        component_descriptions = generate_component_descriptions(supabase)
-        part_descriptions = generate_part_descriptions(supabase)
-        vehicle_descriptions = generate_vehicle_descriptions(supabase)
-        failure_descriptions = generate_failure_descriptions(supabase)
+        vehicle_type_descriptions = generate_with_cache(
+            cache, 'vehicle_types', vehicle_types, 'type_id',
+            lambda vt: (vt,),
+            generate_vehicle_type_descriptions
+        )
+        component_descriptions = generate_with_cache(
+            cache, 'components', components, 'component_id',
+            lambda comp: (comp,),
+            generate_component_descriptions
+        )
+        part_descriptions = generate_with_cache(
+            cache, 'parts', parts, 'part_id',
+            lambda part: (part, vehicle_types_by_id.get(part['type_id'], {}), components_by_id.get(part['component_id'], {})),
+            lambda stale_parts: generate_part_descriptions(stale_parts, vehicle_types_by_id, components_by_id)
+        )
+        vehicle_descriptions = generate_with_cache(
+            cache, 'vehicles', vehicles, 'vehicle_id',
+            lambda vehicle: (vehicle, vehicle_types_by_id.get(vehicle['type_id'], {})),
+            lambda stale_vehicles: generate_vehicle_descriptions(stale_vehicles, vehicle_types_by_id)
+        )
+        failure_descriptions = generate_failure_descriptions(components)
         
-        # Save descriptions to CSV files for review (optional)
-        print("\nSaving descriptions to CSV files...")
-        os.makedirs('data/descriptions', exist_ok=True)
+        # Save descriptions for the embedding generator
+        if args.format == 'parquet' and not pyarrow_available:
+            print("\nWarning: pyarrow is not installed, falling back to CSV output")
+        print(f"\nSaving descriptions as {args.format.upper()} files...")
+        os.makedirs(DESCRIPTIONS_DIR, exist_ok=True)
         
-        pd.DataFrame(vehicle_type_descriptions).to_csv('data/descriptions/vehicle_type_descriptions.csv', index=False)
-        pd.DataFrame(component_descriptions).to_csv('data/descriptions/component_descriptions.csv', index=False)
-        pd.DataFrame(part_descriptions).to_csv('data/descriptions/part_descriptions.csv', index=False)
-        pd.DataFrame(vehicle_descriptions).to_csv('data/descriptions/vehicle_descriptions.csv', index=False)
-        pd.DataFrame(failure_descriptions).to_csv('data/descriptions/failure_descriptions.csv', index=False)
+        save_descriptions(vehicle_type_descriptions, 'vehicle_type_descriptions', args.format)
+        save_descriptions(component_descriptions, 'component_descriptions', args.format)
+        save_descriptions(part_descriptions, 'part_descriptions', args.format)
+        save_descriptions(vehicle_descriptions, 'vehicle_descriptions', args.format)
+        save_descriptions(failure_descriptions, 'failure_descriptions', args.format)
+        save_description_cache(cache)
         
-        print("Descriptions saved to data/descriptions/ directory")
+        print(f"Descriptions saved to {DESCRIPTIONS_DIR}/ directory")
         print("\nNext step: Generate embeddings using these descriptions")
         print("Run generate_embeddings.py to create and store embeddings")
         
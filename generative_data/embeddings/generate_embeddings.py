@@ -7,12 +7,33 @@ and stores them in the Supabase database for semantic search capabilities.
 """
 
 import os
+import json
 import time
+import asyncio
+import argparse
+import random
 import pandas as pd
 import numpy as np
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APIStatusError, RateLimitError
 from dotenv import load_dotenv
-from utils.database import connect_to_supabase
+from utils.database import connect_to_supabase, bulk_upload
+from utils.embedding_cache import EmbeddingCache
+
+# Optional aiolimiter import for rate limiting concurrent embedding requests
+try:
+    from aiolimiter import AsyncLimiter
+    aiolimiter_available = True
+except ImportError:
+    aiolimiter_available = False
+
+# Optional pyarrow import for Parquet descriptions and converting description CSVs to Parquet
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+    pyarrow_available = True
+except ImportError:
+    pyarrow_available = False
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +54,51 @@ client = OpenAI(api_key=api_key)
 # Embedding model to use
 EMBEDDING_MODEL = "text-embedding-3-small"
 
+# Maximum number of inputs the embeddings endpoint accepts per request
+EMBEDDING_BATCH_SIZE = 2048
+
+# Maximum number of embedding requests in flight at once
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", 8))
+
+# Request and token rate limits for the embeddings endpoint when aiolimiter is installed
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", 3000))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", 1000000))
+
+# Description rows read, embedded and uploaded at a time; one chunk fills every concurrent request
+DESCRIPTION_CHUNK_SIZE = int(os.getenv("DESCRIPTION_CHUNK_SIZE", EMBEDDING_BATCH_SIZE * EMBEDDING_MAX_IN_FLIGHT))
+
+# With --batch-api, cache misses at least this large go through the OpenAI Batch API
+# (half the price, completes asynchronously within 24 hours); smaller ones use the regular endpoint
+BATCH_API_MIN_TEXTS = 1000
+BATCH_API_POLL_INTERVAL = 30
+
+# Maximum number of attempts per batch and the cap on backoff between them
+EMBEDDING_RETRY_LIMIT = 8
+RETRY_MAX_DELAY = 60
+
+# Rows per request when uploads fall back to the Supabase REST API
+# (about 30 KB of JSON per 1536-dimension embedding, so 500 rows is roughly 15 MB)
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "500"))
+
+# Description files and the embedding tables they are uploaded to; columns lists the
+# description columns copied into the table alongside the embedding
+EMBEDDING_JOBS = [
+    {'label': 'vehicle type', 'descriptions': 'vehicle_type_descriptions', 'table': 'vehicle_type_embeddings',
+     'text_column': 'description', 'columns': ['type_id', 'description'], 'include_model': True},
+    {'label': 'component', 'descriptions': 'component_descriptions', 'table': 'component_embeddings',
+     'text_column': 'description', 'columns': ['component_id', 'description'], 'include_model': True},
+    # No description or embedding_model columns in this table based on schema
+    {'label': 'part', 'descriptions': 'part_descriptions', 'table': 'part_embeddings',
+     'text_column': 'description', 'columns': ['part_id'], 'include_model': False},
+    {'label': 'vehicle', 'descriptions': 'vehicle_descriptions', 'table': 'vehicle_embeddings',
+     'text_column': 'description', 'columns': ['vehicle_id', 'description'], 'include_model': True},
+    {'label': 'failure description', 'descriptions': 'failure_descriptions', 'table': 'failure_description_embeddings',
+     'text_column': 'symptom_description', 'columns': ['component_id', 'symptom_description'], 'include_model': True},
+]
+
+# On-disk cache of embeddings from previous runs, keyed by model and text
+embedding_cache = EmbeddingCache()
+
 
 def get_embedding(text, model=EMBEDDING_MODEL):
     """Get embedding for a text using OpenAI's API."""
@@ -52,354 +118,283 @@ def get_embedding(text, model=EMBEDDING_MODEL):
         return None
 
 
-def batch_get_embeddings(texts, model=EMBEDDING_MODEL, batch_size=100, retry_limit=3):
-    """Get embeddings for a batch of texts with rate limiting and retries."""
-    all_embeddings = []
-    
-    # Process in batches to avoid rate limits
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i+batch_size]
-        retry_count = 0
-        
-        while retry_count < retry_limit:
-            try:
-                # Replace newlines with spaces
-                cleaned_batch = [text.replace("\n", " ") for text in batch]
-                
-                response = client.embeddings.create(
-                    input=cleaned_batch,
-                    model=model
-                )
-                
-                # Extract embeddings from response
-                batch_embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(batch_embeddings)
-                
-                # Add a small delay to avoid rate limits
-                if i + batch_size < len(texts):
-                    time.sleep(0.5)
-                
-                break  # Success, exit retry loop
-                
-            except Exception as e:
-                retry_count += 1
-                print(f"Error in batch {i//batch_size + 1}, retry {retry_count}: {str(e)}")
-                
-                if retry_count >= retry_limit:
-                    print(f"Failed to get embeddings for batch {i//batch_size + 1} after {retry_limit} retries")
-                    # Add None values for this batch
-                    all_embeddings.extend([None] * len(batch))
-                else:
-                    # Exponential backoff
-                    time.sleep(2 ** retry_count)
-    
-    return all_embeddings
+def is_retryable_error(error):
+    """Return whether an API error is transient: rate limits, connection problems, timeouts or 5xx."""
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
 
 
-def process_vehicle_type_embeddings(supabase):
-    """Process and store embeddings for vehicle types."""
-    print("\nProcessing vehicle type embeddings...")
-    
-    # Load descriptions from CSV
-    df = pd.read_csv('data/descriptions/vehicle_type_descriptions.csv')
-    
-    if df.empty:
-        print("No vehicle type descriptions found")
-        return 0
-    
-    # Get embeddings for all descriptions
-    print(f"Generating embeddings for {len(df)} vehicle type descriptions...")
-    embeddings = batch_get_embeddings(df['description'].tolist())
-    
-    # Add embeddings to dataframe
-    df['embedding'] = embeddings
-    
-    # Filter out any rows with None embeddings
-    df = df.dropna(subset=['embedding'])
-    
-    # Upload embeddings to Supabase
-    print(f"Uploading {len(df)} vehicle type embeddings to Supabase...")
-    
-    try:
-        # Prepare data for upload
-        upload_data = []
-        for _, row in df.iterrows():
-            upload_data.append({
-                'type_id': row['type_id'],
-                'description': row['description'],
-                'embedding': row['embedding'],
-                'embedding_model': EMBEDDING_MODEL
-            })
-        
-        # Upload in batches to avoid payload size issues
-        batch_size = 50
-        for i in range(0, len(upload_data), batch_size):
-            batch = upload_data[i:i+batch_size]
-            response = supabase.table('vehicle_type_embeddings').upsert(batch).execute()
-            
-            if hasattr(response, 'error') and response.error:
-                print(f"Error uploading batch {i//batch_size + 1}: {response.error}")
-            
-            # Add a small delay between batches
-            if i + batch_size < len(upload_data):
-                time.sleep(0.5)
-        
-        print(f"Successfully uploaded {len(df)} vehicle type embeddings")
-        return len(df)
-    
-    except Exception as e:
-        print(f"Error uploading vehicle type embeddings: {str(e)}")
-        return 0
+def estimate_tokens(texts):
+    """Roughly estimate the tokens in a batch of texts (about four characters per token in English)."""
+    return sum(len(text) for text in texts) // 4 + len(texts)
 
 
-def process_component_embeddings(supabase):
-    """Process and store embeddings for components."""
-    print("\nProcessing component embeddings...")
-    
-    # Load descriptions from CSV
-    df = pd.read_csv('data/descriptions/component_descriptions.csv')
-    
-    if df.empty:
-        print("No component descriptions found")
-        return 0
-    
-    # Get embeddings for all descriptions
-    print(f"Generating embeddings for {len(df)} component descriptions...")
-    embeddings = batch_get_embeddings(df['description'].tolist())
-    
-    # Add embeddings to dataframe
-    df['embedding'] = embeddings
-    
-    # Filter out any rows with None embeddings
-    df = df.dropna(subset=['embedding'])
-    
-    # Upload embeddings to Supabase
-    print(f"Uploading {len(df)} component embeddings to Supabase...")
-    
-    try:
-        # Prepare data for upload
-        upload_data = []
-        for _, row in df.iterrows():
-            upload_data.append({
-                'component_id': row['component_id'],
-                'description': row['description'],
-                'embedding': row['embedding'],
-                'embedding_model': EMBEDDING_MODEL
-            })
-        
-        # Upload in batches
-        batch_size = 50
-        for i in range(0, len(upload_data), batch_size):
-            batch = upload_data[i:i+batch_size]
-            response = supabase.table('component_embeddings').upsert(batch).execute()
-            
-            if hasattr(response, 'error') and response.error:
-                print(f"Error uploading batch {i//batch_size + 1}: {response.error}")
-            
-            # Add a small delay between batches
-            if i + batch_size < len(upload_data):
-                time.sleep(0.5)
-        
-        print(f"Successfully uploaded {len(df)} component embeddings")
-        return len(df)
-    
-    except Exception as e:
-        print(f"Error uploading component embeddings: {str(e)}")
-        return 0
+def retry_delay(error, retry_count):
+    """Seconds to wait before the next attempt, honoring Retry-After when the API sends it."""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = response.headers.get('retry-after')
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            pass
+    
+    # Jittered exponential backoff so concurrent batches do not retry in lockstep
+    return min(RETRY_MAX_DELAY, 2 ** retry_count) + random.uniform(0, 1)
 
 
-def process_part_embeddings(supabase):
-    """Process and store embeddings for parts."""
-    print("\nProcessing part embeddings...")
-    
-    # Load descriptions from CSV
-    df = pd.read_csv('data/descriptions/part_descriptions.csv')
-    
-    if df.empty:
-        print("No part descriptions found")
-        return 0
-    
-    # Get embeddings for all descriptions
-    print(f"Generating embeddings for {len(df)} part descriptions...")
-    embeddings = batch_get_embeddings(df['description'].tolist())
-    
-    # Add embeddings to dataframe
-    df['embedding'] = embeddings
-    
-    # Filter out any rows with None embeddings
-    df = df.dropna(subset=['embedding'])
-    
-    # Upload embeddings to Supabase
-    print(f"Uploading {len(df)} part embeddings to Supabase...")
-    
-    try:
-        # Prepare data for upload - note: part_embeddings table might have different schema
-        upload_data = []
-        for _, row in df.iterrows():
-            upload_data.append({
-                'part_id': row['part_id'],
-                'embedding': row['embedding']
-                # No description or embedding_model columns in this table based on schema
-            })
+async def request_batch_embeddings(async_client, batch, batch_number, model, retry_limit, semaphore,
+                                   limiter=None, token_limiter=None):
+    """Request embeddings for one batch of texts, retrying transient errors with backoff."""
+    for retry_count in range(1, retry_limit + 1):
+        try:
+            async with semaphore:
+                # Throughput is governed by the request and token rate limits rather than fixed sleeps
+                if limiter is not None:
+                    await limiter.acquire()
+                if token_limiter is not None:
+                    await token_limiter.acquire(min(estimate_tokens(batch), EMBEDDING_TOKENS_PER_MINUTE))
+                response = await async_client.embeddings.create(
+                    input=batch,
+                    model=model
+                )
+            
+            # Extract embeddings from response in input order
+            # float32 arrays take a fraction of the memory of lists of Python floats
+            return [np.asarray(item.embedding, dtype=np.float32)
+                    for item in sorted(response.data, key=lambda item: item.index)]
         
-        # Upload in batches
-        batch_size = 50
-        for i in range(0, len(upload_data), batch_size):
-            batch = upload_data[i:i+batch_size]
-            response = supabase.table('part_embeddings').upsert(batch).execute()
+        except Exception as e:
+            print(f"Error in batch {batch_number}, retry {retry_count}: {str(e)}")
             
-            if hasattr(response, 'error') and response.error:
-                print(f"Error uploading batch {i//batch_size + 1}: {response.error}")
+            # Requests the API rejected outright will fail the same way again
+            if not is_retryable_error(e):
+                break
             
-            # Add a small delay between batches
-            if i + batch_size < len(upload_data):
-                time.sleep(0.5)
-        
-        print(f"Successfully uploaded {len(df)} part embeddings")
-        return len(df)
+            if retry_count < retry_limit:
+                await asyncio.sleep(retry_delay(e, retry_count))
     
-    except Exception as e:
-        print(f"Error uploading part embeddings: {str(e)}")
-        return 0
+    print(f"Failed to get embeddings for batch {batch_number} after {retry_count} attempt(s)")
+    # Add None values for this batch
+    return [None] * len(batch)
 
 
-def process_vehicle_embeddings(supabase):
-    """Process and store embeddings for vehicles."""
-    print("\nProcessing vehicle embeddings...")
-    
-    # Load descriptions from CSV
-    df = pd.read_csv('data/descriptions/vehicle_descriptions.csv')
-    
-    if df.empty:
-        print("No vehicle descriptions found")
-        return 0
-    
-    # Get embeddings for all descriptions
-    print(f"Generating embeddings for {len(df)} vehicle descriptions...")
-    embeddings = batch_get_embeddings(df['description'].tolist())
-    
-    # Add embeddings to dataframe
-    df['embedding'] = embeddings
-    
-    # Filter out any rows with None embeddings
-    df = df.dropna(subset=['embedding'])
-    
-    # Upload embeddings to Supabase
-    print(f"Uploading {len(df)} vehicle embeddings to Supabase...")
-    
+async def gather_embeddings(texts, model, batch_size, retry_limit, max_in_flight):
+    """Request all batches concurrently, with at most max_in_flight requests outstanding."""
+    semaphore = asyncio.Semaphore(max_in_flight)
+    limiter = AsyncLimiter(EMBEDDING_REQUESTS_PER_MINUTE, 60) if aiolimiter_available else None
+    token_limiter = AsyncLimiter(EMBEDDING_TOKENS_PER_MINUTE, 60) if aiolimiter_available else None
+    batches = [texts[i:i+batch_size] for i in range(0, len(texts), batch_size)]
+    
+    # The async client's connection pool is bound to this event loop, so it lives only for this call
+    async_client = AsyncOpenAI(api_key=api_key)
     try:
-        # Prepare data for upload
-        upload_data = []
-        for _, row in df.iterrows():
-            upload_data.append({
-                'vehicle_id': row['vehicle_id'],
-                'description': row['description'],
-                'embedding': row['embedding'],
-                'embedding_model': EMBEDDING_MODEL
-            })
-        
-        # Upload in batches
-        batch_size = 50
-        for i in range(0, len(upload_data), batch_size):
-            batch = upload_data[i:i+batch_size]
-            response = supabase.table('vehicle_embeddings').upsert(batch).execute()
-            
-            if hasattr(response, 'error') and response.error:
-                print(f"Error uploading batch {i//batch_size + 1}: {response.error}")
-            
-            # Add a small delay between batches
-            if i + batch_size < len(upload_data):
-                time.sleep(0.5)
+        results = await asyncio.gather(*(
+            request_batch_embeddings(async_client, batch, batch_number, model, retry_limit, semaphore,
+                                     limiter, token_limiter)
+            for batch_number, batch in enumerate(batches, start=1)
+        ))
+    finally:
+        await async_client.close()
+    
+    return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+
+def request_embeddings(texts, model=EMBEDDING_MODEL, batch_size=EMBEDDING_BATCH_SIZE, retry_limit=EMBEDDING_RETRY_LIMIT,
+                       max_in_flight=EMBEDDING_MAX_IN_FLIGHT):
+    """Request embeddings for already-cleaned texts from the API, sending batches concurrently."""
+    return asyncio.run(gather_embeddings(texts, model, batch_size, retry_limit, max_in_flight))
+
+
+def request_embeddings_batch_api(texts, model=EMBEDDING_MODEL, batch_size=EMBEDDING_BATCH_SIZE,
+                                 poll_interval=BATCH_API_POLL_INTERVAL):
+    """Embed already-cleaned texts with an OpenAI Batch API job, waiting for it to finish."""
+    # One embeddings request per batch of texts; custom_id records where the batch starts
+    lines = [
+        json.dumps({
+            "custom_id": str(start),
+            "method": "POST",
+            "url": "/v1/embeddings",
+            "body": {"model": model, "input": texts[start:start + batch_size]}
+        })
+        for start in range(0, len(texts), batch_size)
+    ]
+    batch_file = client.files.create(file=("embeddings.jsonl", "\n".join(lines).encode()), purpose="batch")
+    batch = client.batches.create(input_file_id=batch_file.id, endpoint="/v1/embeddings", completion_window="24h")
+    print(f"Submitted batch job {batch.id} with {len(lines)} requests")
+    
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+    
+    embeddings = [None] * len(texts)
+    if batch.status != "completed" or not batch.output_file_id:
+        print(f"Batch job {batch.id} ended with status {batch.status}")
+        return embeddings
+    
+    # Requests that failed inside the job are left as None, like failed synchronous batches
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        result = json.loads(line)
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            print(f"Batch request {result.get('custom_id')} failed: {result.get('error') or response.get('status_code')}")
+            continue
         
-        print(f"Successfully uploaded {len(df)} vehicle embeddings")
-        return len(df)
+        start = int(result["custom_id"])
+        for item in response["body"]["data"]:
+            embeddings[start + item["index"]] = np.asarray(item["embedding"], dtype=np.float32)
     
-    except Exception as e:
-        print(f"Error uploading vehicle embeddings: {str(e)}")
-        return 0
+    return embeddings
 
 
-def process_failure_embeddings(supabase):
-    """Process and store embeddings for failure descriptions."""
-    print("\nProcessing failure description embeddings...")
-    
-    # Load descriptions from CSV
-    df = pd.read_csv('data/descriptions/failure_descriptions.csv')
-    
-    if df.empty:
-        print("No failure descriptions found")
-        return 0
-    
-    # Get embeddings for all descriptions
-    print(f"Generating embeddings for {len(df)} failure descriptions...")
-    embeddings = batch_get_embeddings(df['symptom_description'].tolist())
-    
-    # Add embeddings to dataframe
-    df['embedding'] = embeddings
-    
-    # Filter out any rows with None embeddings
-    df = df.dropna(subset=['embedding'])
-    
-    # Upload embeddings to Supabase
-    print(f"Uploading {len(df)} failure description embeddings to Supabase...")
-    
+def batch_get_embeddings(texts, model=EMBEDDING_MODEL, batch_size=EMBEDDING_BATCH_SIZE, retry_limit=EMBEDDING_RETRY_LIMIT,
+                         use_batch_api=False):
+    """Get embeddings for a batch of texts, embedding each distinct text once and only on a cache miss."""
+    # Replace newlines with spaces; the cache is keyed on the text the API actually embeds
+    cleaned_texts = [text.replace("\n", " ") for text in texts]
+    
+    # Repeated descriptions share one embedding
+    unique_texts = list(dict.fromkeys(cleaned_texts))
+    embeddings = embedding_cache.get_many(unique_texts, model)
+    
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    print(f"{len(unique_texts)} distinct of {len(texts)} texts: found {len(unique_texts) - len(missing)} cached embeddings, "
+          f"requesting {len(missing)} from the API")
+    
+    if missing:
+        missing_texts = [unique_texts[i] for i in missing]
+        if use_batch_api and len(missing_texts) >= BATCH_API_MIN_TEXTS:
+            fetched = request_embeddings_batch_api(missing_texts, model=model, batch_size=batch_size)
+        else:
+            fetched = request_embeddings(missing_texts, model=model, batch_size=batch_size, retry_limit=retry_limit)
+        embedding_cache.put_many(missing_texts, fetched, model)
+        for i, embedding in zip(missing, fetched):
+            embeddings[i] = embedding
+    
+    embeddings_by_text = dict(zip(unique_texts, embeddings))
+    return [embeddings_by_text[text] for text in cleaned_texts]
+
+
+def cache_csv_as_parquet(csv_path, parquet_path):
+    """Convert a description CSV to zstd-compressed Parquet one block at a time, so later runs read it columnar."""
+    temp_path = parquet_path + ".tmp"
     try:
-        # Prepare data for upload
-        upload_data = []
-        for _, row in df.iterrows():
-            upload_data.append({
-                'component_id': row['component_id'],
-                'symptom_description': row['symptom_description'],
-                'embedding': row['embedding'],
-                'embedding_model': EMBEDDING_MODEL
-            })
+        # Descriptions may contain quoted newlines
+        reader = pacsv.open_csv(csv_path, parse_options=pacsv.ParseOptions(newlines_in_values=True))
+        with pq.ParquetWriter(temp_path, reader.schema, compression='zstd') as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+        os.replace(temp_path, parquet_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def iter_descriptions(name, columns=None, chunk_size=DESCRIPTION_CHUNK_SIZE):
+    """Yield the given columns of descriptions written by generate_descriptions.py in chunks of rows."""
+    parquet_path = f"data/descriptions/{name}.parquet"
+    csv_path = f"data/descriptions/{name}.csv"
+    
+    # Use whichever file was written most recently so a --format csv run is not shadowed
+    csv_is_newer = os.path.exists(csv_path) and (not os.path.exists(parquet_path) or
+                                                 os.path.getmtime(csv_path) > os.path.getmtime(parquet_path))
+    
+    # Convert a newer CSV to Parquet once, so this and later runs skip CSV parsing and type inference
+    if pyarrow_available and csv_is_newer:
+        try:
+            cache_csv_as_parquet(csv_path, parquet_path)
+            csv_is_newer = False
+        except (pa.ArrowInvalid, OSError) as e:
+            print(f"Could not cache {csv_path} as Parquet, reading the CSV directly: {str(e)}")
+    
+    if pyarrow_available and not csv_is_newer and os.path.exists(parquet_path):
+        for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(csv_path, chunksize=chunk_size, usecols=columns)
+
+
+def process_embeddings(supabase, job, use_batch_api=False):
+    """Generate and store embeddings for one entity type described by an EMBEDDING_JOBS entry."""
+    label = job['label']
+    print(f"\nProcessing {label} embeddings...")
+    
+    # Embed and upload one chunk at a time so memory stays bounded by the chunk size
+    total = 0
+    columns = list(dict.fromkeys(job['columns'] + [job['text_column']]))
+    for chunk_number, df in enumerate(iter_descriptions(job['descriptions'], columns=columns), 1):
+        if df.empty:
+            continue
+        
+        # Get embeddings for the chunk's descriptions
+        print(f"Generating {len(df)} {label} embeddings (chunk {chunk_number})...")
+        df['embedding'] = batch_get_embeddings(df[job['text_column']].tolist(), use_batch_api=use_batch_api)
+        
+        # Filter out any rows with None embeddings
+        df = df.dropna(subset=['embedding'])
         
-        # Upload in batches
-        batch_size = 50
-        for i in range(0, len(upload_data), batch_size):
-            batch = upload_data[i:i+batch_size]
-            response = supabase.table('failure_description_embeddings').upsert(batch).execute()
+        # Upload embeddings to Supabase
+        print(f"Uploading {len(df)} {label} embeddings to Supabase...")
+        
+        try:
+            # Prepare data for upload
+            upload_df = df[job['columns'] + ['embedding']]
+            if job['include_model']:
+                upload_df = upload_df.assign(embedding_model=EMBEDDING_MODEL)
+            upload_data = upload_df.to_dict(orient='records')
             
-            if hasattr(response, 'error') and response.error:
-                print(f"Error uploading batch {i//batch_size + 1}: {response.error}")
+            # COPY over a direct Postgres connection when configured, otherwise batched REST upserts
+            if not bulk_upload(supabase, job['table'], upload_data, chunk_size=UPLOAD_BATCH_SIZE):
+                print(f"Some batches failed to upload to {job['table']}")
             
-            # Add a small delay between batches
-            if i + batch_size < len(upload_data):
-                time.sleep(0.5)
+            total += len(df)
         
-        print(f"Successfully uploaded {len(df)} failure description embeddings")
-        return len(df)
-    
-    except Exception as e:
-        print(f"Error uploading failure description embeddings: {str(e)}")
-        return 0
+        except Exception as e:
+            print(f"Error uploading {label} embeddings: {str(e)}")
+    
+    if total:
+        print(f"Successfully uploaded {total} {label} embeddings")
+    else:
+        print(f"No {label} embeddings were uploaded")
+    return total
 
 
 def check_embedding_tables(supabase):
-    """Check if embedding tables exist and have the vector extension."""
+    """Check that every embedding table exists, with a single information_schema lookup."""
     print("\nChecking embedding tables...")
+    table_names = [job['table'] for job in EMBEDDING_JOBS]
     
-    # Check if the vector extension is installed
     try:
-        # Check if tables exist
-        tables_response = supabase.table('vehicle_type_embeddings').select('id').limit(1).execute()
-        
-        if hasattr(tables_response, 'error') and tables_response.error:
-            print(f"Error checking vehicle_type_embeddings table: {tables_response.error}")
-            print("Tables may not exist or may not have the correct structure.")
-            return False
-        
-        print("Embedding tables exist and are accessible.")
-        return True
-    
+        # list_tables (create_list_tables_function.sql) returns the names that exist in one round-trip
+        response = supabase.rpc('list_tables', {'names': table_names}).execute()
+        existing = {row['table_name'] for row in response.data}
     except Exception as e:
-        print(f"Error checking embedding tables: {str(e)}")
+        print(f"Could not call list_tables, probing each table instead: {str(e)}")
+        existing = set()
+        for table_name in table_names:
+            try:
+                supabase.table(table_name).select('id').limit(1).execute()
+                existing.add(table_name)
+            except Exception:
+                pass
+    
+    missing = [table_name for table_name in table_names if table_name not in existing]
+    if missing:
+        print(f"Missing embedding tables: {', '.join(missing)}")
         print("Please ensure the embedding tables are created with the vector extension.")
         return False
+    
+    print("Embedding tables exist and are accessible.")
+    return True
 
 
 def main():
     """Main function to generate and store embeddings."""
+    parser = argparse.ArgumentParser(description='Generate and store embeddings for entity descriptions')
+    parser.add_argument('--batch-api', action='store_true',
+                        help='Embed large jobs through the OpenAI Batch API (cheaper, but may take hours)')
+    args = parser.parse_args()
     
     print("======== Automotive Embedding Generation ========")
     print("Connecting to Supabase...")
@@ -417,20 +412,13 @@ def main():
             return 1
         
         # Process embeddings for each entity type
-        vt_count = process_vehicle_type_embeddings(supabase)
-        comp_count = process_component_embeddings(supabase)
-        part_count = process_part_embeddings(supabase)
-        vehicle_count = process_vehicle_embeddings(supabase)
-        failure_count = process_failure_embeddings(supabase)
+        counts = {job['label']: process_embeddings(supabase, job, use_batch_api=args.batch_api) for job in EMBEDDING_JOBS}
         
         # Summary
         print("\n======== Embedding Generation Summary ========")
-        print(f"Vehicle Type Embeddings: {vt_count}")
-        print(f"Component Embeddings: {comp_count}")
-        print(f"Part Embeddings: {part_count}")
-        print(f"Vehicle Embeddings: {vehicle_count}")
-        print(f"Failure Description Embeddings: {failure_count}")
-        print(f"Total Embeddings: {vt_count + comp_count + part_count + vehicle_count + failure_count}")
+        for label, count in counts.items():
+            print(f"{label.title()} Embeddings: {count}")
+        print(f"Total Embeddings: {sum(counts.values())}")
         
         print("\nEmbedding generation and storage complete!")
         print("You can now use these embeddings for semantic search and similarity matching.")
@@ -37,6 +37,9 @@ client = OpenAI(api_key=api_key)
 # Embedding model to use
 EMBEDDING_MODEL = "text-embedding-3-small"
 
+# Rows fetched per request from the part price descriptions view
+PAGE_SIZE = 1000
+
 
 def get_embedding(text, model=EMBEDDING_MODEL):
     """Get embedding for a text using OpenAI's API."""
@@ -60,6 +63,9 @@ def batch_get_embeddings(texts, model=EMBEDDING_MODEL, batch_size=100, retry_lim
     """Get embeddings for a batch of texts with rate limiting and retries."""
     all_embeddings = []
     
+    # Replace newlines with spaces once, rather than on every retry of a batch
+    texts = [text.replace("\n", " ") for text in texts]
+    
     # Process in batches to avoid rate limits
     for i in range(0, len(texts), batch_size):
         batch = texts[i:i+batch_size]
@@ -67,22 +73,14 @@ def batch_get_embeddings(texts, model=EMBEDDING_MODEL, batch_size=100, retry_lim
         
         while retry_count < retry_limit:
             try:
-                # Replace newlines with spaces
-                cleaned_batch = [text.replace("\n", " ") for text in batch]
-                
                 response = client.embeddings.create(
-                    input=cleaned_batch,
+                    input=batch,
                     model=model
                 )
                 
                 # Extract embeddings from response
                 batch_embeddings = [item.embedding for item in response.data]
                 all_embeddings.extend(batch_embeddings)
-                
-                # Add a small delay to avoid rate limits
-                if i + batch_size < len(texts):
-                    time.sleep(0.5)
-                
                 break  # Success, exit retry loop
                 
             except Exception as e:
@@ -100,93 +98,45 @@ def batch_get_embeddings(texts, model=EMBEDDING_MODEL, batch_size=100, retry_lim
     return all_embeddings
 
 
+def fetch_part_price_descriptions(supabase, page_size=PAGE_SIZE):
+    """Fetch (price_id, description) rows for current part prices from the part_price_descriptions_v view."""
+    rows = []
+    start = 0
+    
+    # PostgREST caps rows per response, so page through the view in price_id order
+    while True:
+        response = (supabase.table('part_price_descriptions_v')
+                    .select('price_id, description')
+                    .order('price_id')
+                    .range(start, start + page_size - 1)
+                    .execute())
+        rows.extend(response.data)
+        
+        if len(response.data) < page_size:
+            return rows
+        start += page_size
+
+
 def process_part_price_embeddings(supabase):
     """Process and store embeddings for part prices."""
     print("Processing embeddings for part prices...")
     
-    # First, we need to get the descriptions to embed
+    # First, we need to get the descriptions to embed; they are built server-side by the
+    # part_price_descriptions_v view, so fail fast instead of joining whole tables in Python
     try:
-        # Try using the run_query function first
-        query = """
-        SELECT 
-            pp.price_id,
-            p.part_id,
-            p.part_name,
-            p.part_number,
-            c.component_name,
-            pp.base_price,
-            pp.wholesale_price,
-            pp.retail_price,
-            pp.manufacturer_suggested_price,
-            pp.currency
-        FROM 
-            part_prices pp
-            JOIN parts p ON pp.part_id = p.part_id
-            JOIN components c ON p.component_id = c.component_id
-        WHERE 
-            pp.is_current = TRUE
-        """
-        
-        try:
-            # Try with run_query function
-            response = supabase.rpc('run_query', {'query': query}).execute()
-            part_prices = response.data
-        except Exception as e:
-            print(f"Error using run_query function: {str(e)}")
-            print("Falling back to direct query approach...")
-            
-            # Fallback: Get data from each table separately and join in Python
-            pp_response = supabase.table('part_prices').select('*').eq('is_current', True).execute()
-            parts_response = supabase.table('parts').select('*').execute()
-            components_response = supabase.table('components').select('*').execute()
-            
-            # Convert to dictionaries for faster lookup
-            parts_dict = {p['part_id']: p for p in parts_response.data}
-            components_dict = {c['component_id']: c for c in components_response.data}
-            
-            # Join the data manually
-            part_prices = []
-            for pp in pp_response.data:
-                part = parts_dict.get(pp['part_id'])
-                if part:
-                    component = components_dict.get(part['component_id'])
-                    if component:
-                        # Combine data into a single record
-                        record = {
-                            'price_id': pp['price_id'],
-                            'part_id': pp['part_id'],
-                            'part_name': part['part_name'],
-                            'part_number': part['part_number'],
-                            'component_name': component['component_name'],
-                            'base_price': pp['base_price'],
-                            'wholesale_price': pp['wholesale_price'],
-                            'retail_price': pp['retail_price'],
-                            'manufacturer_suggested_price': pp['manufacturer_suggested_price'],
-                            'currency': pp['currency']
-                        }
-                        part_prices.append(record)
+        rows = fetch_part_price_descriptions(supabase)
+    except Exception as e:
+        raise RuntimeError(f"Could not read part_price_descriptions_v ({str(e)}). "
+                           "Run sql/create_part_price_descriptions_view.sql in your Supabase SQL editor first.") from e
+    
+    try:
+        price_ids = [row['price_id'] for row in rows]
+        descriptions = [row['description'] for row in rows]
         
-        if not part_prices:
+        if not descriptions:
             print("No part prices found in the database")
             return 0
         
-        # Generate descriptions for embedding
-        descriptions = []
-        price_ids = []
-        
-        for pp in part_prices:
-            # Create a rich description that includes pricing information
-            description = f"Part: {pp['part_name']} (Part Number: {pp['part_number']}). "
-            description += f"Component type: {pp['component_name']}. "
-            description += f"Base price: ${pp['base_price']:.2f}. "
-            description += f"Wholesale price: ${pp['wholesale_price']:.2f}. "
-            description += f"Retail price: ${pp['retail_price']:.2f}. "
-            description += f"MSRP: ${pp['manufacturer_suggested_price']:.2f}. "
-            description += f"Currency: {pp['currency']}."
-            
-            descriptions.append(description)
-            price_ids.append(pp['price_id'])
-        
         print(f"Generated {len(descriptions)} descriptions for part prices")
         
         # Get embeddings for the descriptions
@@ -206,17 +156,12 @@ def process_part_price_embeddings(supabase):
             else:
                 print(f"Skipping part price {price_id} due to missing embedding")
         
-        # Insert embeddings in batches to avoid timeout
+        # Upsert embeddings in batches to avoid timeout; existing embeddings for a price are replaced
         batch_size = 50
         for i in range(0, len(embedding_data), batch_size):
             batch = embedding_data[i:i+batch_size]
             try:
-                # Check for existing embeddings and delete them first
-                price_ids_batch = [item["price_id"] for item in batch]
-                supabase.table('part_price_embeddings').delete().in_('price_id', price_ids_batch).execute()
-                
-                # Insert new embeddings
-                supabase.table('part_price_embeddings').insert(batch).execute()
+                supabase.table('part_price_embeddings').upsert(batch, on_conflict='price_id').execute()
                 print(f"Inserted batch {i//batch_size + 1}/{(len(embedding_data)-1)//batch_size + 1}")
             except Exception as e:
                 print(f"Error inserting batch {i//batch_size + 1}: {str(e)}")
@@ -10,11 +10,22 @@ import os
 import sys
 import time
 import json
+import random
+import logging
+import asyncio
 import traceback
-from datetime import datetime
+import numpy as np
 from utils.database import connect_to_supabase
+from utils.embedding_cache import EmbeddingCache
 from dotenv import load_dotenv
-from openai import OpenAI, RateLimitError
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+
+# Optional tqdm import for a progress bar instead of per-batch log lines
+try:
+    from tqdm import tqdm
+    tqdm_available = True
+except ImportError:
+    tqdm_available = False
 
 # Load environment variables with override to ensure .env values take precedence
 load_dotenv(override=True)
@@ -25,29 +36,56 @@ if not api_key:
     print("Error: OPENAI_API_KEY not found in environment variables")
     sys.exit(1)
 
-# Initialize OpenAI client with timeout
-client = OpenAI(api_key=api_key, timeout=60.0)  # 60 second timeout
-
 # Embedding model to use
 EMBEDDING_MODEL = "text-embedding-3-small"
 
+# Chunks embedded per API request and inserted per database request
+EMBEDDING_BATCH_SIZE = 96
+
+# Maximum number of embedding requests in flight at once
+MAX_CONCURRENT_REQUESTS = 8
+
 # Progress tracking file
 PROGRESS_FILE = "embedding_progress.json"
 
+# Rewrite the progress file only after this many new chunks or this many seconds
+PROGRESS_SAVE_CHUNKS = 500
+PROGRESS_SAVE_INTERVAL = 10
+
+# Chunks stored since the progress file was last written, and when that was
+unsaved_chunks = 0
+last_progress_save = time.monotonic()
+
+# On-disk cache of embeddings, keyed by model and exact chunk content
+embedding_cache = EmbeddingCache()
+
+logger = logging.getLogger(__name__)
+
 def log_message(message, level="INFO"):
-    """Log a message with timestamp."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] [{level}] {message}")
+    """Log a message at the given level; DEBUG per-chunk detail is skipped unless LOG_LEVEL enables it."""
+    logger.log(logging.getLevelName(level), message)
 
 def save_progress(processed_chunks):
-    """Save progress to a file."""
+    """Save progress to a file, replacing it atomically."""
+    global unsaved_chunks, last_progress_save
     try:
-        with open(PROGRESS_FILE, 'w') as f:
-            json.dump({"processed_chunks": processed_chunks}, f)
-        log_message(f"Progress saved: {len(processed_chunks)} chunks processed")
+        tmp_path = PROGRESS_FILE + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"processed_chunks": sorted(processed_chunks)}, f)
+        os.replace(tmp_path, PROGRESS_FILE)
+        unsaved_chunks = 0
+        last_progress_save = time.monotonic()
+        log_message(f"Progress saved: {len(processed_chunks)} chunks processed", "DEBUG")
     except Exception as e:
         log_message(f"Error saving progress: {str(e)}", "ERROR")
 
+def record_progress(processed_chunks, new_chunks):
+    """Count newly stored chunks and save progress once enough chunks or time have accumulated."""
+    global unsaved_chunks
+    unsaved_chunks += new_chunks
+    if unsaved_chunks >= PROGRESS_SAVE_CHUNKS or time.monotonic() - last_progress_save > PROGRESS_SAVE_INTERVAL:
+        save_progress(processed_chunks)
+
 def load_progress():
     """Load progress from a file."""
     if not os.path.exists(PROGRESS_FILE):
@@ -62,85 +100,83 @@ def load_progress():
         log_message(f"Error loading progress: {str(e)}", "ERROR")
         return []
 
-def get_embedding_with_retry(text, max_retries=5, backoff_factor=2):
-    """Get embedding for a text using OpenAI's API with retry logic."""
-    retries = 0
-    while retries <= max_retries:
+async def get_embeddings_with_retry(async_client, texts, semaphore, max_attempts=5, max_wait=30):
+    """Get embeddings for a batch of texts in one API request, retrying the whole batch on transient errors."""
+    # Replace newlines with spaces
+    texts = [text.replace("\n", " ") for text in texts]
+    
+    for attempt in range(1, max_attempts + 1):
         try:
-            # Replace newlines with spaces
-            text = text.replace("\n", " ")
-            
-            log_message(f"Requesting embedding (attempt {retries+1}/{max_retries+1})...")
-            start_time = time.time()
-            
-            response = client.embeddings.create(
-                input=[text],
-                model=EMBEDDING_MODEL
-            )
+            # Limit the number of requests in flight; waits between retries happen outside the limit
+            async with semaphore:
+                log_message(f"Requesting {len(texts)} embeddings (attempt {attempt}/{max_attempts})...", "DEBUG")
+                start_time = time.time()
+                
+                response = await async_client.embeddings.create(
+                    input=texts,
+                    model=EMBEDDING_MODEL
+                )
             
             elapsed = time.time() - start_time
-            log_message(f"Embedding received in {elapsed:.2f} seconds")
+            log_message(f"Embeddings received in {elapsed:.2f} seconds", "DEBUG")
+            
+            # Return the embedding vectors in input order
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except (RateLimitError, APIConnectionError, InternalServerError) as e:
+            # Rate limits, timeouts, connection problems and 5xx responses are worth retrying
+            log_message(f"Transient error getting embeddings: {str(e)}", "WARNING")
+            if attempt == max_attempts:
+                break
             
-            # Return the embedding vector
-            return response.data[0].embedding
-        except RateLimitError:
-            wait_time = backoff_factor ** retries
-            log_message(f"Rate limit exceeded. Waiting {wait_time} seconds...", "WARNING")
-            time.sleep(wait_time)
-            retries += 1
+            # Full jitter: a random wait up to the exponential backoff, so concurrent batches do not retry in lockstep
+            wait_time = random.uniform(0, min(max_wait, 2 ** attempt))
+            log_message(f"Waiting {wait_time:.1f} seconds before retrying...", "WARNING")
+            await asyncio.sleep(wait_time)
         except Exception as e:
-            log_message(f"Error getting embedding: {str(e)}", "ERROR")
+            # Anything else (bad request, authentication) will not succeed on retry
+            log_message(f"Error getting embeddings: {str(e)}", "ERROR")
             log_message(traceback.format_exc(), "DEBUG")
-            
-            # If we've hit a timeout or connection error, wait longer
-            if "timeout" in str(e).lower() or "connection" in str(e).lower():
-                wait_time = 30 + (backoff_factor ** retries)
-                log_message(f"Connection issue detected. Waiting {wait_time} seconds...", "WARNING")
-                time.sleep(wait_time)
-            
-            retries += 1
+            return None
     
-    log_message(f"Failed to get embedding after {max_retries} retries", "ERROR")
+    log_message(f"Failed to get embeddings after {max_attempts} attempts", "ERROR")
     return None
 
 def chunk_documentation(doc_path, chunk_size=1000, overlap=200):
     """Split documentation into overlapping chunks."""
     try:
-        # Read documentation file
-        with open(doc_path, 'r') as f:
-            content = f.read()
-        
-        log_message(f"Read documentation file: {len(content)} characters")
-        
-        # Split content into chunks
         chunks = []
+        step = chunk_size - overlap
         
-        # Get total length
-        total_len = len(content)
-        
-        # Create chunks with overlap
-        for i in range(0, total_len, chunk_size - overlap):
-            # Get chunk
-            chunk_end = min(i + chunk_size, total_len)
-            chunk = content[i:chunk_end]
-            
-            # Extract section title if possible
-            section_match = chunk.split("\n", 1)[0] if "\n" in chunk else chunk[:50]
-            section_title = section_match.strip("# ")[:100]  # Limit title length
-            
-            # Add chunk with metadata
-            chunks.append({
-                'chunk_id': len(chunks) + 1,
-                'content': chunk,
-                'section_title': section_title,
-                'start_char': i,
-                'end_char': chunk_end
-            })
+        # Stream the file through a sliding window instead of reading it all at once
+        with open(doc_path, 'r') as f:
+            window = f.read(chunk_size)
+            i = 0
             
-            # Stop if we've reached the end
-            if chunk_end == total_len:
-                break
+            while window:
+                chunk_end = i + len(window)
+                
+                # Extract section title if possible, without splitting the whole chunk
+                newline = window.find("\n")
+                section_match = window[:newline] if newline != -1 else window[:50]
+                section_title = section_match.strip("# ")[:100]  # Limit title length
+                
+                # Add chunk with metadata
+                chunks.append({
+                    'chunk_id': len(chunks) + 1,
+                    'content': window,
+                    'section_title': section_title,
+                    'start_char': i,
+                    'end_char': chunk_end
+                })
+                
+                # Stop if we've reached the end; otherwise slide forward, keeping the overlap
+                next_text = f.read(step)
+                if not next_text:
+                    break
+                window = window[step:] + next_text
+                i += step
         
+        log_message(f"Read documentation file: {chunks[-1]['end_char'] if chunks else 0} characters")
         log_message(f"Created {len(chunks)} chunks")
         return chunks
     
@@ -164,6 +200,135 @@ def get_processed_chunks(supabase):
         log_message(traceback.format_exc(), "DEBUG")
         return []
 
+def get_missing_chunk_ids(supabase, chunk_ids):
+    """Get the subset of chunk IDs that are not stored in the database yet."""
+    try:
+        # missing_chunk_ids (create_missing_chunk_ids_function.sql) does the set difference in the database
+        log_message(f"Checking {len(chunk_ids)} chunks against the database...")
+        response = supabase.rpc('missing_chunk_ids', {'ids': chunk_ids}).execute()
+        missing = {row['chunk_id'] for row in response.data}
+    except Exception as e:
+        log_message(f"Could not call missing_chunk_ids, fetching all processed chunks instead: {str(e)}", "WARNING")
+        missing = set(chunk_ids) - set(get_processed_chunks(supabase))
+    
+    log_message(f"Found {len(chunk_ids) - len(missing)} chunks in database")
+    return missing
+
+def store_batch(supabase, batch, embeddings, processed_chunk_ids):
+    """Upsert a batch of embedded chunks and record their progress; returns the number stored."""
+    chunk_ids = [chunk['chunk_id'] for chunk in batch]
+    
+    # One request per batch; upserting on chunk_id makes re-runs idempotent
+    log_message(f"Storing {len(batch)} chunks in database...", "DEBUG")
+    response = supabase.table('documentation_embeddings').upsert([
+        {
+            'chunk_id': chunk['chunk_id'],
+            'section_title': chunk['section_title'],
+            'content': chunk['content'],
+            'embedding': np.asarray(embedding, dtype=np.float32).tolist(),
+            'embedding_model': EMBEDDING_MODEL
+        }
+        for chunk, embedding in zip(batch, embeddings)
+    ], on_conflict='chunk_id').execute()
+    
+    if hasattr(response, 'error') and response.error:
+        log_message(f"Error storing chunks {chunk_ids[0]}-{chunk_ids[-1]}: {response.error}", "ERROR")
+        return 0
+    
+    # The stored text is no longer needed; drop it so peak memory does not hold every chunk until the end
+    for chunk in batch:
+        chunk['content'] = None
+    
+    processed_chunk_ids.update(chunk_ids)
+    record_progress(processed_chunk_ids, len(chunk_ids))
+    log_message(f"Successfully stored chunks {chunk_ids[0]}-{chunk_ids[-1]}", "DEBUG")
+    return len(batch)
+
+async def embed_batch(async_client, batch, semaphore, write_queue):
+    """Embed one batch of chunks and queue it for the database writer; failed batches are queued without embeddings."""
+    chunk_ids = [chunk['chunk_id'] for chunk in batch]
+    log_message(f"Processing chunks {chunk_ids[0]}-{chunk_ids[-1]}...", "DEBUG")
+    
+    embeddings = None
+    try:
+        # Only request chunks whose text has not been embedded before, whatever their chunk_id; the cache
+        # is keyed on the text exactly as sent to the API, so clean it the same way get_embeddings_with_retry does
+        texts = [chunk['content'].replace("\n", " ") for chunk in batch]
+        embeddings = embedding_cache.get_many(texts, EMBEDDING_MODEL)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing:
+            # Generate embeddings with retry logic
+            missing_texts = [texts[i] for i in missing]
+            fetched = await get_embeddings_with_retry(async_client, missing_texts, semaphore)
+            
+            if fetched:
+                embedding_cache.put_many(missing_texts, fetched, EMBEDDING_MODEL)
+                for i, embedding in zip(missing, fetched):
+                    embeddings[i] = embedding
+            else:
+                log_message(f"Failed to generate embeddings for chunks {chunk_ids[0]}-{chunk_ids[-1]}", "ERROR")
+                embeddings = None
+        else:
+            log_message(f"Using cached embeddings for chunks {chunk_ids[0]}-{chunk_ids[-1]}", "DEBUG")
+    except Exception as e:
+        log_message(f"Exception processing chunks {chunk_ids[0]}-{chunk_ids[-1]}: {str(e)}", "ERROR")
+        log_message(traceback.format_exc(), "DEBUG")
+        embeddings = None
+    
+    await write_queue.put((batch, embeddings))
+
+async def write_batches(supabase, write_queue, total_batches, processed_chunk_ids):
+    """Store embedded batches from the queue one at a time as they arrive; returns the number of chunks stored."""
+    successful_chunks = 0
+    progress = tqdm(total=total_batches, desc="embedding", unit="batch") if tqdm_available else None
+    try:
+        for completed in range(1, total_batches + 1):
+            batch, embeddings = await write_queue.get()
+            
+            if embeddings is not None:
+                chunk_ids = [chunk['chunk_id'] for chunk in batch]
+                try:
+                    # supabase-py is synchronous, so insert in a thread while embedding requests keep running
+                    successful_chunks += await asyncio.to_thread(store_batch, supabase, batch, embeddings, processed_chunk_ids)
+                except Exception as e:
+                    log_message(f"Exception storing chunks {chunk_ids[0]}-{chunk_ids[-1]}: {str(e)}", "ERROR")
+                    log_message(traceback.format_exc(), "DEBUG")
+            
+            # Report progress once per finished batch rather than logging every request
+            if progress is not None:
+                progress.update(1)
+                progress.set_postfix({'ok': successful_chunks})
+            else:
+                log_message(f"Finished {completed}/{total_batches} batches ({successful_chunks} chunks stored)")
+    finally:
+        if progress is not None:
+            progress.close()
+    
+    return successful_chunks
+
+async def process_batches(supabase, chunks_to_process, processed_chunk_ids):
+    """Embed and store all chunks, with up to MAX_CONCURRENT_REQUESTS embedding requests in flight."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    batches = [chunks_to_process[start:start + EMBEDDING_BATCH_SIZE]
+               for start in range(0, len(chunks_to_process), EMBEDDING_BATCH_SIZE)]
+    
+    # Embedding tasks hand finished batches to a single writer, so inserts overlap with embedding requests;
+    # the bounded queue keeps embeddings from piling up in memory when the database is slower
+    write_queue = asyncio.Queue(maxsize=MAX_CONCURRENT_REQUESTS)
+    
+    # The async client's connection pool is bound to this event loop, so it lives only for this call
+    async_client = AsyncOpenAI(api_key=api_key, timeout=60.0)  # 60 second timeout
+    try:
+        successful_chunks, *_ = await asyncio.gather(
+            write_batches(supabase, write_queue, len(batches), processed_chunk_ids),
+            *(embed_batch(async_client, batch, semaphore, write_queue) for batch in batches)
+        )
+    finally:
+        await async_client.close()
+    
+    return successful_chunks
+
 def process_documentation(supabase, doc_path='project_documentation.txt'):
     """Process documentation file and store embeddings in Supabase."""
     # Check if table exists
@@ -185,59 +350,29 @@ def process_documentation(supabase, doc_path='project_documentation.txt'):
     
     log_message(f"Generated {len(chunks)} chunks")
     
-    # Get already processed chunks from database
-    db_processed_chunks = get_processed_chunks(supabase)
+    # Get chunks not yet stored in the database
+    chunk_ids = [chunk['chunk_id'] for chunk in chunks]
+    missing_chunk_ids = get_missing_chunk_ids(supabase, chunk_ids)
+    db_processed_chunks = [chunk_id for chunk_id in chunk_ids if chunk_id not in missing_chunk_ids]
     
     # Get locally saved progress
     local_processed_chunks = load_progress()
     
-    # Combine both sources of processed chunks
-    processed_chunk_ids = list(set(db_processed_chunks + local_processed_chunks))
+    # Combine both sources of processed chunks; a set keeps membership checks O(1)
+    processed_chunk_ids = set(db_processed_chunks) | set(local_processed_chunks)
     log_message(f"Found {len(processed_chunk_ids)} already processed chunks")
     
     # Filter out already processed chunks
     chunks_to_process = [chunk for chunk in chunks if chunk['chunk_id'] not in processed_chunk_ids]
     log_message(f"Processing {len(chunks_to_process)} new chunks")
     
-    # Process each chunk
-    successful_chunks = 0
-    for i, chunk in enumerate(chunks_to_process):
-        chunk_id = chunk['chunk_id']
-        log_message(f"Processing chunk {chunk_id} ({i+1}/{len(chunks_to_process)})...")
-        
-        try:
-            # Generate embedding with retry logic
-            embedding = get_embedding_with_retry(chunk['content'])
-            
-            if not embedding:
-                log_message(f"Failed to generate embedding for chunk {chunk_id}", "ERROR")
-                continue
-            
-            # Store in Supabase
-            log_message(f"Storing chunk {chunk_id} in database...")
-            response = supabase.table('documentation_embeddings').insert({
-                'chunk_id': chunk_id,
-                'section_title': chunk['section_title'],
-                'content': chunk['content'],
-                'embedding': embedding,
-                'embedding_model': EMBEDDING_MODEL
-            }).execute()
-            
-            if hasattr(response, 'error') and response.error:
-                log_message(f"Error storing chunk {chunk_id}: {response.error}", "ERROR")
-            else:
-                successful_chunks += 1
-                processed_chunk_ids.append(chunk_id)
-                save_progress(processed_chunk_ids)
-                log_message(f"Successfully stored chunk {chunk_id}")
-        except Exception as e:
-            log_message(f"Exception processing chunk {chunk_id}: {str(e)}", "ERROR")
-            log_message(traceback.format_exc(), "DEBUG")
-        
-        # Add a delay between API calls to avoid rate limits
-        delay = 1.0  # Increased delay to 1 second
-        log_message(f"Waiting {delay} seconds before next chunk...")
-        time.sleep(delay)
+    # Process chunks in batches, one embeddings request and one insert per batch
+    try:
+        successful_chunks = asyncio.run(process_batches(supabase, chunks_to_process, processed_chunk_ids))
+    finally:
+        # Flush progress not yet written, including when interrupted
+        if unsaved_chunks:
+            save_progress(processed_chunk_ids)
     
     total_processed = len(db_processed_chunks) + successful_chunks
     log_message(f"Processed {successful_chunks} new chunks")
@@ -283,6 +418,11 @@ def main():
         return 1
 
 if __name__ == "__main__":
+    # Per-chunk detail is logged at DEBUG; set LOG_LEVEL=DEBUG to see it
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format="[%(asctime)s] [%(levelname)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    
     try:
         sys.exit(main())
     except KeyboardInterrupt:
@@ -4,11 +4,31 @@ Generate embeddings for regions data
 """
 
 import os
+import random
+import asyncio
 import numpy as np
 import json
+from collections import Counter, defaultdict
 from dotenv import load_dotenv
 import openai
 from supabase import create_client
+from utils.embedding_cache import EmbeddingCache, embedding_key
+
+# Optional pyarrow import for writing a Parquet snapshot of the embeddings
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    pyarrow_available = True
+except ImportError:
+    pyarrow_available = False
+
+# Optional tiktoken import for exact token counts when packing batches
+try:
+    import tiktoken
+    tiktoken_available = True
+except ImportError:
+    tiktoken_available = False
 
 # Load environment variables
 load_dotenv()
@@ -18,6 +38,22 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_ENCODING = "cl100k_base"
 EMBEDDING_DIMENSIONS = 1536  # Dimensions for text-embedding-3-small
+MAX_CONCURRENT_REQUESTS = 8  # Embedding requests in flight at once
+PAGE_SIZE = 1000  # Rows per request when paging through region_embeddings
+MAX_TOKENS_PER_BATCH = 8000  # Token budget for a single embedding request
+
+# Makes used to characterize a county's vehicle preferences
+LUXURY_MAKES = frozenset({'BMW', 'Mercedes', 'Audi', 'Lexus'})
+TRUCK_MAKES = frozenset({'Ford', 'Chevrolet', 'GMC', 'Ram'})
+
+# Tokenizer used to size batches, loaded once (None falls back to a character estimate)
+encoding = tiktoken.get_encoding(EMBEDDING_ENCODING) if tiktoken_available else None
+
+# Local Parquet copy of the region embeddings, written before they are uploaded
+SNAPSHOT_PATH = "data/embeddings/region_embeddings.parquet"
+
+# On-disk cache of embeddings, so unchanged region descriptions are not re-embedded
+embedding_cache = EmbeddingCache()
 
 # Initialize OpenAI client
 openai.api_key = OPENAI_API_KEY
@@ -27,7 +63,10 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def generate_region_description(region, region_vehicles_data=None, regions_by_id=None):
+# Parent region ids already reported as missing, so each is only logged once
+missing_parent_region_ids = set()
+
+def generate_region_description(region, registrations_for_region=None, make_counts_for_region=None, regions_by_id=None):
     """Generate a rich description for a region based on its characteristics"""
     region_type = region['type']
     name = region['name']
@@ -36,24 +75,17 @@ def generate_region_description(region, region_vehicles_data=None, regions_by_id
     # Calculate total registrations and most recent year
     total_registrations = 0
     recent_total = 0
-    top_vehicles = []
+    registrations = registrations_for_region or []
+    make_counts = make_counts_for_region or Counter()
+    top_makes = []
     
-    if region_vehicles_data:
-        registrations = [rv for rv in region_vehicles_data if rv['region_id'] == region['region_id']]
+    if registrations:
         total_registrations = sum(r['total_registrations'] for r in registrations)
         recent_registrations = [r for r in registrations if r['year'] >= 2021]
         recent_total = sum(r['total_registrations'] for r in recent_registrations) if recent_registrations else 0
         
         # Get top vehicle makes
-        make_counts = {}
-        for r in registrations:
-            make = r['make']
-            if make in make_counts:
-                make_counts[make] += r['total_registrations']
-            else:
-                make_counts[make] = r['total_registrations']
-        
-        top_makes = sorted(make_counts.items(), key=lambda x: x[1], reverse=True)[:5] if make_counts else []
+        top_makes = make_counts.most_common(5)
         
     # Generate description based on region type, population, and vehicle data
     if region_type == 'state':
@@ -92,17 +124,14 @@ def generate_region_description(region, region_vehicles_data=None, regions_by_id
     else:  # County
         # Get parent state information
         parent_state = "Unknown"
-        if region['parent_region_id'] is not None and regions_by_id is not None:
-            parent_state = regions_by_id.get(region['parent_region_id'], "Unknown")
-                
-        if parent_state == "Unknown":
-            # Try to get it directly
-            try:
-                parent_response = supabase.table('regions').select('name').eq('region_id', region['parent_region_id']).execute()
-                if parent_response.data:
-                    parent_state = parent_response.data[0]['name']
-            except:
-                pass
+        parent_region_id = region['parent_region_id']
+        if parent_region_id is not None and regions_by_id is not None:
+            parent_state = regions_by_id.get(parent_region_id, "Unknown")
+            
+            # regions_by_id holds every region, so a miss means the parent really is missing
+            if parent_state == "Unknown" and parent_region_id not in missing_parent_region_ids:
+                missing_parent_region_ids.add(parent_region_id)
+                print(f"Warning: parent region {parent_region_id} not found, using 'Unknown'")
         
         description = f"{name} is a county in {parent_state} with a population of {population:,} people. "
         
@@ -114,12 +143,14 @@ def generate_region_description(region, region_vehicles_data=None, regions_by_id
             if top_makes:
                 description += f"Popular vehicle makes in the area include {', '.join([make for make, _ in top_makes[:3]])}. "
                 
-            # Add some local flavor based on vehicle preferences
-            luxury_makes = ['BMW', 'Mercedes', 'Audi', 'Lexus']
-            truck_makes = ['Ford', 'Chevrolet', 'GMC', 'Ram']
-            
-            luxury_count = sum(count for make, count in make_counts.items() if make in luxury_makes) if make_counts else 0
-            truck_count = sum(count for make, count in make_counts.items() if make in truck_makes) if make_counts else 0
+            # Add some local flavor based on vehicle preferences, in a single pass over the makes
+            luxury_count = 0
+            truck_count = 0
+            for make, count in make_counts.items():
+                if make in LUXURY_MAKES:
+                    luxury_count += count
+                elif make in TRUCK_MAKES:
+                    truck_count += count
             
             if luxury_count > truck_count and luxury_count > total_registrations * 0.2:
                 description += "The area has a high concentration of luxury vehicles. "
@@ -137,49 +168,115 @@ def get_embedding(text, model=EMBEDDING_MODEL):
         print(f"Error getting embedding: {e}")
         return None
 
-def batch_get_embeddings(texts, model=EMBEDDING_MODEL, batch_size=100, retry_limit=3):
+async def request_batch_embeddings(async_client, batch_texts, batch_number, total_batches, model, retry_limit, semaphore):
     """
-    Get embeddings for a batch of texts, with retry logic
+    Get embeddings for one batch of texts, with retry logic
     """
-    all_embeddings = []
-    
-    # Process in batches to avoid API limits
-    for i in range(0, len(texts), batch_size):
-        batch_texts = texts[i:i+batch_size]
-        
-        # Retry logic
-        retries = 0
-        while retries < retry_limit:
-            try:
-                response = openai.embeddings.create(
+    retries = 0
+    while retries < retry_limit:
+        try:
+            async with semaphore:
+                response = await async_client.embeddings.create(
                     input=batch_texts,
                     model=model
                 )
-                batch_embeddings = [embedding.embedding for embedding in response.data]
-                all_embeddings.extend(batch_embeddings)
-                print(f"Processed batch {i//batch_size + 1}/{(len(texts) + batch_size - 1)//batch_size}")
-                break
-            except Exception as e:
-                retries += 1
-                print(f"Error in batch {i//batch_size + 1}, retry {retries}/{retry_limit}: {e}")
-                if retries == retry_limit:
-                    # If all retries failed, use zero embeddings as placeholder
-                    print(f"Using zero embeddings for batch {i//batch_size + 1} after all retries failed")
-                    zero_embeddings = [[0.0] * EMBEDDING_DIMENSIONS for _ in range(len(batch_texts))]
-                    all_embeddings.extend(zero_embeddings)
-    
-    return all_embeddings
+            batch_embeddings = [embedding.embedding for embedding in sorted(response.data, key=lambda item: item.index)]
+            print(f"Processed batch {batch_number}/{total_batches}")
+            return batch_embeddings
+        except Exception as e:
+            retries += 1
+            print(f"Error in batch {batch_number}, retry {retries}/{retry_limit}: {e}")
+            if retries < retry_limit:
+                # Exponential backoff with jitter, outside the concurrency limit
+                await asyncio.sleep(2 ** retries + random.uniform(0, 1))
+    
+    print(f"Failed to get embeddings for batch {batch_number} after all retries")
+    return [None] * len(batch_texts)
+
+def count_tokens(texts):
+    """Count the tokens in each text, estimating about four characters per token without tiktoken"""
+    if encoding is not None:
+        # Reuses the module-level encoding; special-token text is counted as plain text rather than raising
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+    return [len(text) // 4 + 1 for text in texts]
 
-def get_aggregated_vehicle_data(supabase):
+def pack_batches(texts, max_items, max_tokens):
+    """
+    Greedily pack text indices, longest first, into batches within the item and token budgets
+    """
+    token_counts = count_tokens(texts)
+    order = sorted(range(len(texts)), key=lambda i: -token_counts[i])
+    
+    batches = []
+    current_batch = []
+    current_tokens = 0
+    for i in order:
+        if current_batch and (len(current_batch) >= max_items or current_tokens + token_counts[i] > max_tokens):
+            batches.append(current_batch)
+            current_batch = []
+            current_tokens = 0
+        current_batch.append(i)
+        current_tokens += token_counts[i]
+    if current_batch:
+        batches.append(current_batch)
+    
+    return batches
+
+async def gather_embeddings(texts, model, batch_size, max_tokens_per_batch, retry_limit, max_concurrency):
+    """
+    Request all batches concurrently, with at most max_concurrency requests in flight
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    batches = pack_batches(texts, batch_size, max_tokens_per_batch)
+    
+    async_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+    try:
+        results = await asyncio.gather(*(
+            request_batch_embeddings(async_client, [texts[i] for i in batch_indices], batch_number, len(batches), model, retry_limit, semaphore)
+            for batch_number, batch_indices in enumerate(batches, start=1)
+        ))
+    finally:
+        await async_client.close()
+    
+    # Scatter results back into input order
+    embeddings = [None] * len(texts)
+    for batch_indices, batch_embeddings in zip(batches, results):
+        for i, embedding in zip(batch_indices, batch_embeddings):
+            embeddings[i] = embedding
+    return embeddings
+
+def batch_get_embeddings(texts, model=EMBEDDING_MODEL, batch_size=100, max_tokens_per_batch=MAX_TOKENS_PER_BATCH,
+                         retry_limit=3, max_concurrency=MAX_CONCURRENT_REQUESTS):
+    """
+    Get embeddings for a batch of texts as an (N, EMBEDDING_DIMENSIONS) float32 array,
+    only requesting texts missing from the on-disk cache
+    """
+    embeddings = embedding_cache.get_or_compute_many(
+        texts, model,
+        lambda missing_texts: asyncio.run(gather_embeddings(
+            missing_texts, model, batch_size, max_tokens_per_batch, retry_limit, max_concurrency
+        ))
+    )
+    
+    # One float32 array for all texts; rows whose retries all failed stay zero (these are never cached)
+    embedding_matrix = np.zeros((len(texts), EMBEDDING_DIMENSIONS), dtype=np.float32)
+    failed = 0
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            failed += 1
+        else:
+            embedding_matrix[i] = embedding
+    
+    if failed:
+        print(f"Using zero embeddings for {failed} texts after all retries failed")
+    return embedding_matrix
+
+def get_aggregated_vehicle_data(supabase, regions_by_id):
     """
     Fetch aggregated vehicle registration data for all regions
     """
     try:
-        # First get all region data (with names)
-        regions_response = supabase.table('regions').select('region_id, name').execute()
-        regions_by_id = {r['region_id']: r['name'] for r in regions_response.data}
-        
-        # Then get vehicle data
+        # Get vehicle data
         response = supabase.table('region_vehicle_types').select('region_id, registration_count, year_recorded, vehicle_types(make, model)').execute()
         
         # Process the response
@@ -197,10 +294,75 @@ def get_aggregated_vehicle_data(supabase):
                 'total_registrations': item['registration_count']
             })
         
-        return aggregated_data, regions_by_id
+        return aggregated_data
     except Exception as e:
         print(f"Error fetching vehicle data: {e}")
-        return [], {}
+        return []
+
+def group_vehicle_data_by_region(vehicle_data):
+    """
+    Group registration rows by region and total registrations per make, in a single pass
+    """
+    registrations_by_region = defaultdict(list)
+    make_counts_by_region = defaultdict(Counter)
+    for row in vehicle_data:
+        registrations_by_region[row['region_id']].append(row)
+        make_counts_by_region[row['region_id']][row['make']] += row['total_registrations']
+    
+    return registrations_by_region, make_counts_by_region
+
+def save_embeddings_snapshot(region_ids, descriptions, embeddings, path=SNAPSHOT_PATH):
+    """
+    Write region embeddings to zstd-compressed Parquet, storing each vector as a fixed-size float32 list.
+    Rows for other regions already in the snapshot are kept, so incremental runs only replace what changed.
+    """
+    region_id_array = pa.array(region_ids, type=pa.int64())
+    table = pa.table({
+        'region_id': region_id_array,
+        'description': pa.array(descriptions, type=pa.string()),
+        'embedding': pa.FixedSizeListArray.from_arrays(pa.array(embeddings.ravel()), EMBEDDING_DIMENSIONS)
+    })
+    
+    # Merge with the previous snapshot by region_id, replacing the regions embedded in this run
+    if os.path.exists(path):
+        existing = pq.read_table(path).cast(table.schema)
+        unchanged = pc.invert(pc.is_in(existing['region_id'], value_set=region_id_array))
+        table = pa.concat_tables([existing.filter(unchanged), table]).sort_by('region_id')
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    # Write to a temporary file first so an interrupted run never leaves a truncated snapshot
+    temp_path = path + ".tmp"
+    try:
+        pq.write_table(table, temp_path, compression='zstd')
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def description_hash(description, model=EMBEDDING_MODEL):
+    """Hash a description together with the embedding model, so either changing triggers a re-embed"""
+    return embedding_key(description, model).hex()
+
+def fetch_description_hashes(supabase, page_size=PAGE_SIZE):
+    """Fetch the description hash stored for each embedded region"""
+    hashes = {}
+    start = 0
+    
+    # PostgREST caps rows per response, so page through the table in region_id order
+    while True:
+        response = (supabase.table('region_embeddings')
+                    .select('region_id, description_hash')
+                    .order('region_id')
+                    .range(start, start + page_size - 1)
+                    .execute())
+        hashes.update((row['region_id'], row['description_hash']) for row in response.data)
+        
+        if len(response.data) < page_size:
+            return hashes
+        start += page_size
 
 def process_region_embeddings(supabase):
     """Process regions and generate embeddings"""
@@ -214,46 +376,100 @@ def process_region_embeddings(supabase):
         print("No regions found!")
         return
     
+    # All regions are already loaded, so parent names never need a per-county lookup
+    regions_by_id = {r['region_id']: r['name'] for r in regions}
+    
     # Fetch aggregated vehicle data
-    vehicle_data, regions_by_id = get_aggregated_vehicle_data(supabase)
+    vehicle_data = get_aggregated_vehicle_data(supabase, regions_by_id)
+    registrations_by_region, make_counts_by_region = group_vehicle_data_by_region(vehicle_data)
+    
+    # Hashes of the descriptions already embedded, to skip regions that have not changed
+    try:
+        existing_hashes = fetch_description_hashes(supabase)
+    except Exception as e:
+        raise RuntimeError(f"Could not read region_embeddings.description_hash ({e}). "
+                           "Run sql/add_region_embeddings_description_hash.sql in your Supabase SQL editor first.") from e
     
     # Generate descriptions for all regions
     print("Generating region descriptions...")
     descriptions = []
     region_ids = []
+    hashes = []
+    unchanged = 0
     
     for region in regions:
-        description = generate_region_description(region, vehicle_data, regions_by_id)
+        description = generate_region_description(
+            region,
+            registrations_by_region.get(region['region_id']),
+            make_counts_by_region.get(region['region_id']),
+            regions_by_id
+        )
+        
+        h = description_hash(description)
+        if existing_hashes.get(region['region_id']) == h:
+            unchanged += 1
+            continue
+        
         descriptions.append(description)
         region_ids.append(region['region_id'])
+        hashes.append(h)
         print(f"Generated description for {region['name']} ({region['type']})")
     
+    print(f"Skipping {unchanged} regions whose descriptions have not changed")
+    if not descriptions:
+        print("All region embeddings are up to date")
+        return
+    
     # Generate embeddings in batches
     print("Generating embeddings...")
     embeddings = batch_get_embeddings(descriptions)
     
-    # Prepare data for insertion
-    print("Preparing data for insertion...")
-    insert_data = []
-    for i, (region_id, description, embedding) in enumerate(zip(region_ids, descriptions, embeddings)):
-        insert_data.append({
-            'region_id': region_id,
-            'embedding_model': EMBEDDING_MODEL,
-            'embedding': embedding,
-            'description': description
-        })
-    
-    # Insert in batches to avoid API limits
+    # Regions whose embedding failed are left as zero vectors; drop them so their hash is not
+    # stored and the next run retries them instead of treating them as up to date
+    succeeded = embeddings.any(axis=1)
+    failed = len(region_ids) - int(succeeded.sum())
+    if failed:
+        print(f"Skipping {failed} regions whose embeddings failed; they will be retried on the next run")
+        region_ids = [region_id for region_id, ok in zip(region_ids, succeeded) if ok]
+        descriptions = [description for description, ok in zip(descriptions, succeeded) if ok]
+        hashes = [h for h, ok in zip(hashes, succeeded) if ok]
+        embeddings = embeddings[succeeded]
+    if not region_ids:
+        print("No region embeddings to store")
+        return
+    
+    # Keep a local copy, so a failed upload or database reset does not lose paid-for embeddings
+    if pyarrow_available:
+        try:
+            save_embeddings_snapshot(region_ids, descriptions, embeddings)
+            print(f"Saved embeddings snapshot to {SNAPSHOT_PATH}")
+        except Exception as e:
+            print(f"Error saving embeddings snapshot: {e}")
+    
+    # Build and upsert rows one batch at a time to avoid API limits; one row per region
+    print("Upserting embeddings...")
     batch_size = 50
-    for i in range(0, len(insert_data), batch_size):
-        batch = insert_data[i:i+batch_size]
+    total_batches = (len(region_ids) + batch_size - 1) // batch_size
+    for i in range(0, len(region_ids), batch_size):
+        batch = [
+            {
+                'region_id': region_id,
+                'embedding_model': EMBEDDING_MODEL,
+                'embedding': embedding.tolist(),
+                'description': description,
+                'description_hash': h
+            }
+            for region_id, description, embedding, h in zip(
+                region_ids[i:i+batch_size], descriptions[i:i+batch_size], embeddings[i:i+batch_size], hashes[i:i+batch_size]
+            )
+        ]
         try:
-            supabase.table('region_embeddings').insert(batch).execute()
-            print(f"Inserted batch {i//batch_size + 1}/{(len(insert_data) + batch_size - 1)//batch_size}")
+            supabase.table('region_embeddings').upsert(batch, on_conflict='region_id').execute()
+            print(f"Upserted batch {i//batch_size + 1}/{total_batches}")
         except Exception as e:
-            print(f"Error inserting batch {i//batch_size + 1}: {e}")
+            print(f"Error upserting batch {i//batch_size + 1}: {e}")
     
-    print(f"Completed processing {len(regions)} region embeddings")
+    print(f"Completed processing {len(region_ids)} changed region embeddings")
 
 def check_embedding_table(supabase):
     """Check if the region_embeddings table has data"""
@@ -270,23 +486,26 @@ def main():
     """Main function"""
     if not OPENAI_API_KEY:
         print("Error: OPENAI_API_KEY not found in environment variables")
-        return
+        return 1
     
     if not SUPABASE_URL or not SUPABASE_KEY:
         print("Error: Supabase credentials not found in environment variables")
-        return
+        return 1
     
-    # Check if table already has data
+    # Existing rows are upserted by region_id, so re-running only refreshes changed regions
     count = check_embedding_table(supabase)
     if count > 0:
-        print(f"Warning: region_embeddings table already contains {count} rows")
-        confirm = input("Do you want to continue and potentially add duplicate data? (y/n): ")
-        if confirm.lower() != 'y':
-            print("Operation cancelled")
-            return
-    
-    # Process region embeddings
-    process_region_embeddings(supabase)
+        print(f"region_embeddings already has {count} rows; only regions with changed descriptions will be updated")
+    
+    # Process region embeddings; a missing description_hash column needs a migration first
+    try:
+        process_region_embeddings(supabase)
+    except RuntimeError as e:
+        print(f"\nError: {str(e)}")
+        print("Then run this script again.")
+        return 1
+    
+    return 0
 
 if __name__ == "__main__":
-    main()
+    exit(main())
@@ -3,444 +3,361 @@
 Semantic Search Script for Automotive Parts Prediction & Inventory Optimization
 
 This script provides functionality to perform semantic searches across different
-entity types using the embeddings stored in Supabase.
+entity types using the embeddings stored in Supabase. It calls the match_*_enriched
+functions from sql/create_enriched_matching_functions.sql.
 """
 
 import os
+import time
+import random
+import asyncio
+import hashlib
 import argparse
-import pandas as pd
-from openai import OpenAI
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from dotenv import load_dotenv
-from utils.database import connect_to_supabase
-from tabulate import tabulate
+from utils.embedding_cache import EmbeddingCache
+
+# openai, supabase (which brings pandas in through utils.database) and tabulate are imported where
+# first used, so --help starts quickly and queries found in the embedding cache never import openai
+
+# Optional cachetools import for caching match results of repeated searches
+try:
+    from cachetools import TTLCache
+    cachetools_available = True
+except ImportError:
+    cachetools_available = False
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 # Embedding model to use
 EMBEDDING_MODEL = "text-embedding-3-small"
 
+# Texts per embeddings request (the API accepts up to 2048) and requests in flight at once
+EMBEDDING_BATCH_SIZE = 512
+MAX_CONCURRENT_REQUESTS = 5
 
-def get_embedding(text, model=EMBEDDING_MODEL):
-    """Get embedding for a text using OpenAI's API."""
-    try:
-        # Replace newlines with spaces
-        text = text.replace("\n", " ")
-        
-        response = client.embeddings.create(
-            input=[text],
-            model=model
-        )
-        
-        # Return the embedding vector
-        return response.data[0].embedding
-    except Exception as e:
-        print(f"Error getting embedding: {str(e)}")
-        return None
+# Attempts per OpenAI or Supabase request on transient errors, and the cap on the backoff between them
+RETRY_ATTEMPTS = 5
+RETRY_MAX_WAIT = 8
 
+# HTTP statuses of gateway and rate-limit responses from Supabase that are worth retrying
+TRANSIENT_STATUS_CODES = {'429', '500', '502', '503', '504'}
 
-def search_vehicle_types(supabase, query, threshold=0.7, limit=5):
-    """Search for vehicle types using semantic similarity."""
-    print(f"\nSearching for vehicle types similar to: '{query}'")
+# PostgREST returns at most this many rows per response, so larger --limit values are paged
+PAGE_SIZE = 1000
+
+# Short-lived cache of match results keyed by (function, embedding hash, threshold, limit), shared by the search threads
+RPC_CACHE_SIZE = 1024
+RPC_CACHE_TTL = 60
+rpc_cache = TTLCache(maxsize=RPC_CACHE_SIZE, ttl=RPC_CACHE_TTL) if cachetools_available else None
+rpc_cache_lock = threading.Lock()
+
+# On-disk cache of embeddings, so repeating a query skips the API across runs
+embedding_cache = EmbeddingCache()
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    """Create the OpenAI client on first use, on a pooled HTTP client so concurrent requests reuse connections."""
+    from openai import OpenAI
+    from utils.database import create_http_client
     
-    # Get embedding for the query
-    query_embedding = get_embedding(query)
-    if not query_embedding:
-        print("Failed to generate embedding for the query")
-        return None
+    # The SDK retries rate limits, 5xx responses and connection errors with jittered exponential backoff
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=RETRY_ATTEMPTS - 1,
+                  http_client=create_http_client(timeout=600))
+
+
+def request_embeddings(texts, model=EMBEDDING_MODEL):
+    """Embed texts with concurrent API requests of up to EMBEDDING_BATCH_SIZE texts each."""
+    def request_batch(batch):
+        response = get_client().embeddings.create(
+            input=batch,
+            model=model
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
     
-    # Call the match function in Supabase
-    try:
-        response = supabase.rpc(
-            'match_vehicle_types',
-            {
-                'query_embedding': query_embedding,
-                'match_threshold': threshold,
-                'match_count': limit
-            }
-        ).execute()
-        
-        if hasattr(response, 'error') and response.error:
-            print(f"Error searching vehicle types: {response.error}")
-            return None
-        
-        results = response.data
-        
-        if not results:
-            print("No matching vehicle types found")
-            return None
-        
-        # Get additional details for each vehicle type
-        type_ids = [result['type_id'] for result in results]
-        
-        # Fetch vehicle type details directly
-        details_response = supabase.table('vehicle_types').select('*').in_('type_id', type_ids).execute()
-        
-        if hasattr(details_response, 'error') and details_response.error:
-            print(f"Error fetching vehicle type details: {details_response.error}")
-            return results
-        
-        # Create a lookup dictionary for details
-        details_dict = {item['type_id']: item for item in details_response.data}
-        
-        # Combine results with details
-        for result in results:
-            type_id = result['type_id']
-            if type_id in details_dict:
-                result.update(details_dict[type_id])
-        
-        return results
+    batches = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        results = list(executor.map(request_batch, batches))
     
-    except Exception as e:
-        print(f"Error searching vehicle types: {str(e)}")
-        return None
+    return [embedding for batch_embeddings in results for embedding in batch_embeddings]
 
 
-def search_components(supabase, query, threshold=0.7, limit=5):
-    """Search for components using semantic similarity."""
-    print(f"\nSearching for components similar to: '{query}'")
+def get_embeddings(texts, model=EMBEDDING_MODEL):
+    """Get embeddings for a list of texts, sending only texts missing from the on-disk cache to the API."""
+    # Replace newlines with spaces
+    texts = [text.replace("\n", " ") for text in texts]
     
-    # Get embedding for the query
-    query_embedding = get_embedding(query)
-    if not query_embedding:
-        print("Failed to generate embedding for the query")
-        return None
+    embeddings = embedding_cache.get_or_compute_many(texts, model, lambda missing: request_embeddings(missing, model))
+    return [embedding.tolist() for embedding in embeddings]
+
+
+async def aget_embeddings(texts, model=EMBEDDING_MODEL):
+    """Async get_embeddings: texts missing from the on-disk cache are requested concurrently with AsyncOpenAI."""
+    # Replace newlines with spaces
+    texts = [text.replace("\n", " ") for text in texts]
     
-    # Call the match function in Supabase
-    try:
-        response = supabase.rpc(
-            'match_components',
-            {
-                'query_embedding': query_embedding,
-                'match_threshold': threshold,
-                'match_count': limit
-            }
-        ).execute()
-        
-        if hasattr(response, 'error') and response.error:
-            print(f"Error searching components: {response.error}")
-            return None
-        
-        results = response.data
-        
-        if not results:
-            print("No matching components found")
-            return None
-        
-        # Get additional details for each component
-        component_ids = [result['component_id'] for result in results]
-        
-        # Fetch component details directly
-        details_response = supabase.table('components').select('*').in_('component_id', component_ids).execute()
-        
-        if hasattr(details_response, 'error') and details_response.error:
-            print(f"Error fetching component details: {details_response.error}")
-            return results
-        
-        # Create a lookup dictionary for details
-        details_dict = {item['component_id']: item for item in details_response.data}
-        
-        # Combine results with details
-        for result in results:
-            component_id = result['component_id']
-            if component_id in details_dict:
-                result.update(details_dict[component_id])
-        
-        return results
+    cached = embedding_cache.get_many(texts, model)
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, cached) if embedding is None))
+    fetched = {}
     
-    except Exception as e:
-        print(f"Error searching components: {str(e)}")
-        return None
+    if missing:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        batches = [missing[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(missing), EMBEDDING_BATCH_SIZE)]
+        
+        async def request_batch(batch):
+            async with semaphore:
+                response = await async_client.embeddings.create(
+                    input=batch,
+                    model=model
+                )
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        
+        from openai import AsyncOpenAI
+        
+        # The async client's connection pool is bound to the running event loop, so it lives only for this call
+        async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=RETRY_ATTEMPTS - 1)
+        try:
+            results = await asyncio.gather(*(request_batch(batch) for batch in batches))
+        finally:
+            await async_client.close()
+        
+        embeddings = [embedding for batch_embeddings in results for embedding in batch_embeddings]
+        embedding_cache.put_many(missing, embeddings, model)
+        fetched = dict(zip(missing, embeddings))
+    
+    return [fetched[text] if embedding is None else embedding.tolist() for text, embedding in zip(texts, cached)]
 
 
-def search_parts(supabase, query, threshold=0.7, limit=5):
-    """Search for parts using semantic similarity."""
-    print(f"\nSearching for parts similar to: '{query}'")
+async def connect_and_embed(queries):
+    """Connect to Supabase while the queries are embedded, so the two network waits overlap."""
+    from utils.database import connect_to_supabase
     
-    # Get embedding for the query
-    query_embedding = get_embedding(query)
-    if not query_embedding:
-        print("Failed to generate embedding for the query")
-        return None
+    embedding_task = asyncio.create_task(aget_embeddings(queries))
+    
+    # supabase-py connects synchronously, so run it in a thread while the embedding request is in flight
+    supabase = await asyncio.to_thread(connect_to_supabase)
     
-    # Call the match function in Supabase
     try:
-        response = supabase.rpc(
-            'match_parts',
-            {
-                'query_embedding': query_embedding,
-                'match_threshold': threshold,
-                'match_count': limit
-            }
-        ).execute()
-        
-        if hasattr(response, 'error') and response.error:
-            print(f"Error searching parts: {response.error}")
-            return None
-        
-        results = response.data
-        
-        if not results:
-            print("No matching parts found")
-            return None
-        
-        # Get additional details for each part
-        part_ids = [result['part_id'] for result in results]
-        
-        # Fetch part details directly
-        parts_response = supabase.table('parts').select('*').in_('part_id', part_ids).execute()
-        
-        if hasattr(parts_response, 'error') and parts_response.error:
-            print(f"Error fetching part details: {parts_response.error}")
-            return results
-        
-        # Create a lookup dictionary for parts
-        parts_dict = {item['part_id']: item for item in parts_response.data}
-        
-        # Get component and vehicle type details for enrichment
-        component_ids = list(set(parts_dict[part_id]['component_id'] for part_id in parts_dict))
-        type_ids = list(set(parts_dict[part_id]['type_id'] for part_id in parts_dict))
-        
-        # Fetch component details
-        components_response = supabase.table('components').select('*').in_('component_id', component_ids).execute()
-        components_dict = {item['component_id']: item for item in components_response.data}
-        
-        # Fetch vehicle type details
-        vehicle_types_response = supabase.table('vehicle_types').select('*').in_('type_id', type_ids).execute()
-        vehicle_types_dict = {item['type_id']: item for item in vehicle_types_response.data}
-        
-        # Combine results with details
-        for result in results:
-            part_id = result['part_id']
-            if part_id in parts_dict:
-                part = parts_dict[part_id]
-                result.update(part)
-                
-                # Add component details
-                if part['component_id'] in components_dict:
-                    result['component_name'] = components_dict[part['component_id']]['component_name']
-                
-                # Add vehicle type details
-                if part['type_id'] in vehicle_types_dict:
-                    vt = vehicle_types_dict[part['type_id']]
-                    result.update({
-                        'make': vt['make'],
-                        'model': vt['model'],
-                        'year': vt['year']
-                    })
-        
-        return results
+        query_embeddings = await embedding_task
+    except Exception as e:
+        print(f"Error getting embedding: {str(e)}")
+        query_embeddings = None
     
+    return supabase, query_embeddings
+
+
+@lru_cache(maxsize=1024)
+def _fetch_embedding(text, model):
+    """Embed one text through get_embeddings; results are also kept in memory."""
+    return get_embeddings([text], model)[0]
+
+
+def get_embedding(text, model=EMBEDDING_MODEL):
+    """Get embedding for a text using OpenAI's API, reusing cached embeddings of the same text."""
+    try:
+        # Return the embedding vector
+        return _fetch_embedding(text.replace("\n", " "), model)
     except Exception as e:
-        print(f"Error searching parts: {str(e)}")
+        print(f"Error getting embedding: {str(e)}")
         return None
 
 
-def search_vehicles(supabase, query, threshold=0.7, limit=5):
-    """Search for vehicles using semantic similarity."""
-    print(f"\nSearching for vehicles similar to: '{query}'")
-    
-    # Get embedding for the query
-    query_embedding = get_embedding(query)
+def resolve_query_embedding(query, query_embedding=None):
+    """Return the precomputed query embedding, or embed the query when none was given."""
+    if query_embedding is None:
+        query_embedding = get_embedding(query)
     if not query_embedding:
         print("Failed to generate embedding for the query")
-        return None
-    
-    # Call the match function in Supabase
-    try:
-        response = supabase.rpc(
-            'match_vehicles',
-            {
-                'query_embedding': query_embedding,
-                'match_threshold': threshold,
-                'match_count': limit
-            }
-        ).execute()
-        
-        if hasattr(response, 'error') and response.error:
-            print(f"Error searching vehicles: {response.error}")
-            return None
-        
-        results = response.data
-        
-        if not results:
-            print("No matching vehicles found")
-            return None
-        
-        # Get additional details for each vehicle
-        vehicle_ids = [result['vehicle_id'] for result in results]
-        
-        # Fetch vehicle details directly
-        vehicles_response = supabase.table('vehicles').select('*').in_('vehicle_id', vehicle_ids).execute()
-        
-        if hasattr(vehicles_response, 'error') and vehicles_response.error:
-            print(f"Error fetching vehicle details: {vehicles_response.error}")
-            return results
-        
-        # Create a lookup dictionary for vehicles
-        vehicles_dict = {item['vehicle_id']: item for item in vehicles_response.data}
-        
-        # Get vehicle type details for enrichment
-        type_ids = list(set(vehicles_dict[vehicle_id]['type_id'] for vehicle_id in vehicles_dict))
-        
-        # Fetch vehicle type details
-        vehicle_types_response = supabase.table('vehicle_types').select('*').in_('type_id', type_ids).execute()
-        vehicle_types_dict = {item['type_id']: item for item in vehicle_types_response.data}
-        
-        # Combine results with details
-        for result in results:
-            vehicle_id = result['vehicle_id']
-            if vehicle_id in vehicles_dict:
-                vehicle = vehicles_dict[vehicle_id]
-                result.update(vehicle)
-                
-                # Add vehicle type details
-                if vehicle['type_id'] in vehicle_types_dict:
-                    vt = vehicle_types_dict[vehicle['type_id']]
-                    result.update({
-                        'make': vt['make'],
-                        'model': vt['model'],
-                        'year': vt['year']
-                    })
-        
-        return results
+    return query_embedding
+
+
+def is_transient_supabase_error(error):
+    """Connection failures, timeouts and gateway or rate-limit responses are worth retrying."""
+    import httpx
+    from postgrest.exceptions import APIError
     
-    except Exception as e:
-        print(f"Error searching vehicles: {str(e)}")
-        return None
+    if isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, APIError) and str(error.code) in TRANSIENT_STATUS_CODES
 
 
-def search_failure_descriptions(supabase, query, threshold=0.7, limit=5):
-    """Search for failure descriptions using semantic similarity."""
-    print(f"\nSearching for failure descriptions similar to: '{query}'")
+def execute_with_retry(request, max_attempts=RETRY_ATTEMPTS, max_wait=RETRY_MAX_WAIT):
+    """Execute a Supabase request, retrying transient errors with full-jitter exponential backoff."""
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return request.execute()
+        except Exception as e:
+            # Anything else (bad parameters, missing function) will not succeed on retry
+            if attempt == max_attempts or not is_transient_supabase_error(e):
+                raise
+            
+            # Full jitter: a random wait up to the exponential backoff, so the concurrent searches do not retry in lockstep
+            wait_time = random.uniform(0, min(max_wait, 0.5 * 2 ** attempt))
+            print(f"Transient Supabase error ({str(e)}), retrying in {wait_time:.1f} seconds...")
+            time.sleep(wait_time)
+
+
+def match_entities(supabase, function_name, entity_label, query_embedding, threshold, limit):
+    """
+    Call a match_*_enriched function, which returns the matches already joined with their details.
+    Returns (results, message): results is None when nothing matched or the search failed, and message
+    says why, so callers running searches in threads can print it in order with the other output.
+    """
+    # Repeated searches with the same embedding and parameters reuse the recent result instead of a new KNN scan
+    if rpc_cache is not None:
+        embedding_hash = hashlib.blake2b(np.asarray(query_embedding, dtype=np.float32).tobytes(), digest_size=16).digest()
+        cache_key = (function_name, embedding_hash, threshold, limit)
+        with rpc_cache_lock:
+            cached = rpc_cache.get(cache_key)
+        if cached is not None:
+            return cached, None
     
-    # Get embedding for the query
-    query_embedding = get_embedding(query)
-    if not query_embedding:
-        print("Failed to generate embedding for the query")
-        return None
+    params = {
+        'query_embedding': query_embedding,
+        'match_threshold': threshold,
+        'match_count': limit
+    }
     
-    # Call the match function in Supabase
     try:
-        response = supabase.rpc(
-            'match_failure_descriptions',
-            {
-                'query_embedding': query_embedding,
-                'match_threshold': threshold,
-                'match_count': limit
-            }
-        ).execute()
-        
-        if hasattr(response, 'error') and response.error:
-            print(f"Error searching failure descriptions: {response.error}")
-            return None
-        
-        results = response.data
+        results = []
+        start = 0
+        
+        # The function returns rows ordered by similarity, so pages past PostgREST's row cap are
+        # read with its match_offset argument and stay in order
+        while start < limit:
+            end = min(start + PAGE_SIZE, limit) - 1
+            if limit > PAGE_SIZE:
+                params = {**params, 'match_count': end - start + 1, 'match_offset': start}
+            response = execute_with_retry(supabase.rpc(function_name, params))
+            
+            if hasattr(response, 'error') and response.error:
+                return None, f"Error searching {entity_label}: {response.error}"
+            
+            results.extend(response.data)
+            if len(response.data) < end - start + 1:
+                break
+            start = end + 1
         
         if not results:
-            print("No matching failure descriptions found")
-            return None
-        
-        # Get additional details for each component
-        component_ids = [result['component_id'] for result in results]
-        
-        # Fetch component details directly
-        components_response = supabase.table('components').select('*').in_('component_id', component_ids).execute()
-        
-        if hasattr(components_response, 'error') and components_response.error:
-            print(f"Error fetching component details: {components_response.error}")
-            return results
+            return None, f"No matching {entity_label} found"
         
-        # Create a lookup dictionary for details
-        components_dict = {item['component_id']: item for item in components_response.data}
+        if rpc_cache is not None:
+            with rpc_cache_lock:
+                rpc_cache[cache_key] = results
         
-        # Combine results with details
-        for result in results:
-            component_id = result['component_id']
-            if component_id in components_dict:
-                result['component_name'] = components_dict[component_id]['component_name']
-        
-        return results
+        return results, None
     
     except Exception as e:
-        print(f"Error searching failure descriptions: {str(e)}")
-        return None
+        return None, f"Error searching {entity_label}: {str(e)}"
 
 
-def search_part_prices(supabase, query, threshold=0.7, limit=5):
-    """Search for part prices using semantic similarity."""
-    print(f"\nSearching for part prices similar to: '{query}'")
+# Each entity search calls one match_*_enriched function, which joins the matches with their details server-side
+SEARCH_SPECS = {
+    'vehicle_types': {'rpc': 'match_vehicle_types_enriched', 'label': 'vehicle types'},
+    'components': {'rpc': 'match_components_enriched', 'label': 'components'},
+    'parts': {'rpc': 'match_parts_enriched', 'label': 'parts'},
+    'vehicles': {'rpc': 'match_vehicles_enriched', 'label': 'vehicles'},
+    'failures': {'rpc': 'match_failure_descriptions_enriched', 'label': 'failure descriptions'},
+    'part_prices': {'rpc': 'match_part_prices_enriched', 'label': 'part prices'},
+}
+
+
+def search_entities(supabase, entity_type, query, threshold=0.7, limit=5, query_embedding=None):
+    """Search one entity type from SEARCH_SPECS using semantic similarity."""
+    spec = SEARCH_SPECS[entity_type]
+    print(f"\nSearching for {spec['label']} similar to: '{query}'")
     
-    # Get embedding for the query
-    query_embedding = get_embedding(query)
+    # Get embedding for the query, unless the caller already computed it
+    query_embedding = resolve_query_embedding(query, query_embedding)
     if not query_embedding:
-        print("Failed to generate embedding for the query")
         return None
     
-    # Call the match function in Supabase
-    try:
-        response = supabase.rpc(
-            'match_part_prices',
-            {
-                'query_embedding': query_embedding,
-                'match_threshold': threshold,
-                'match_count': limit
-            }
-        ).execute()
-        
-        if hasattr(response, 'error') and response.error:
-            print(f"Error searching part prices: {response.error}")
-            return None
-        
-        results = response.data
-        
-        if not results:
-            print("No matching part prices found")
-            return None
-        
-        # Get additional details for each part
-        part_ids = list(set([result['part_id'] for result in results]))
-        
-        # Fetch part details directly
-        parts_response = supabase.table('parts').select('*').in_('part_id', part_ids).execute()
-        
-        if hasattr(parts_response, 'error') and parts_response.error:
-            print(f"Error fetching part details: {parts_response.error}")
-            return results
-        
-        # Create a lookup dictionary for parts
-        parts_dict = {item['part_id']: item for item in parts_response.data}
-        
-        # Get component details for enrichment
-        component_ids = list(set([parts_dict[part_id]['component_id'] for part_id in parts_dict if part_id in parts_dict]))
-        
-        # Fetch component details
-        components_response = supabase.table('components').select('*').in_('component_id', component_ids).execute()
-        components_dict = {item['component_id']: item for item in components_response.data}
-        
-        # Combine results with details
-        for result in results:
-            part_id = result['part_id']
-            if part_id in parts_dict:
-                part = parts_dict[part_id]
-                result.update({
-                    'part_name': part['part_name'],
-                    'part_number': part['part_number'],
-                    'description': part.get('description', '')
-                })
-                
-                # Add component details
-                if part['component_id'] in components_dict:
-                    result['component_name'] = components_dict[part['component_id']]['component_name']
-        
-        return results
-    
-    except Exception as e:
-        print(f"Error searching part prices: {str(e)}")
-        return None
+    results, message = match_entities(supabase, spec['rpc'], spec['label'], query_embedding, threshold, limit)
+    if message:
+        print(message)
+    return results
+
+
+def search_vehicle_types(supabase, query, threshold=0.7, limit=5, query_embedding=None):
+    """Search for vehicle types using semantic similarity."""
+    return search_entities(supabase, 'vehicle_types', query, threshold, limit, query_embedding)
+
+
+def search_components(supabase, query, threshold=0.7, limit=5, query_embedding=None):
+    """Search for components using semantic similarity."""
+    return search_entities(supabase, 'components', query, threshold, limit, query_embedding)
+
+
+def search_parts(supabase, query, threshold=0.7, limit=5, query_embedding=None):
+    """Search for parts using semantic similarity."""
+    return search_entities(supabase, 'parts', query, threshold, limit, query_embedding)
+
+
+def search_vehicles(supabase, query, threshold=0.7, limit=5, query_embedding=None):
+    """Search for vehicles using semantic similarity."""
+    return search_entities(supabase, 'vehicles', query, threshold, limit, query_embedding)
+
+
+def search_failure_descriptions(supabase, query, threshold=0.7, limit=5, query_embedding=None):
+    """Search for failure descriptions using semantic similarity."""
+    return search_entities(supabase, 'failures', query, threshold, limit, query_embedding)
+
+
+def search_part_prices(supabase, query, threshold=0.7, limit=5, query_embedding=None):
+    """Search for part prices using semantic similarity."""
+    return search_entities(supabase, 'part_prices', query, threshold, limit, query_embedding)
+
+
+# Headers and row formatter of the results table for each entity type
+RESULT_TABLES = {
+    'vehicle_types': (
+        ['Type ID', 'Make', 'Model', 'Year', 'Similarity'],
+        lambda r: [r['type_id'], r.get('make', 'N/A'), r.get('model', 'N/A'),
+                   r.get('year', 'N/A'), f"{r['similarity']:.4f}"]
+    ),
+    'components': (
+        ['Component ID', 'Component Name', 'Similarity'],
+        lambda r: [r['component_id'], r.get('component_name', 'N/A'),
+                   f"{r['similarity']:.4f}"]
+    ),
+    'parts': (
+        ['Part ID', 'Part Name', 'Part Number', 'Component', 'Vehicle', 'Similarity'],
+        lambda r: [r['part_id'], r.get('part_name', 'N/A'), r.get('part_number', 'N/A'),
+                   r.get('component_name', 'N/A'),
+                   f"{r.get('year', 'N/A')} {r.get('make', 'N/A')} {r.get('model', 'N/A')}",
+                   f"{r['similarity']:.4f}"]
+    ),
+    'part_prices': (
+        ['Price ID', 'Part Name', 'Quality', 'Price', 'Component', 'Similarity'],
+        lambda r: [r['price_id'], r.get('part_name', 'N/A'),
+                   r.get('quality', 'N/A'), f"${r.get('price', 'N/A'):.2f}",
+                   r.get('component_name', 'N/A'),
+                   f"{r['similarity']:.4f}"]
+    ),
+    'vehicles': (
+        ['Vehicle ID', 'Make', 'Model', 'Year', 'Mileage', 'Similarity'],
+        lambda r: [r['vehicle_id'], r.get('make', 'N/A'), r.get('model', 'N/A'),
+                   r.get('year', 'N/A'), r.get('mileage', 'N/A'),
+                   f"{r['similarity']:.4f}"]
+    ),
+    'failures': (
+        ['ID', 'Component', 'Description', 'Similarity'],
+        lambda r: [r['id'], r.get('component_name', 'N/A'), r['description'],
+                   f"{r['similarity']:.4f}"]
+    ),
+}
+
+# Table used for any other entity type
+DEFAULT_RESULT_TABLE = (
+    ['ID', 'Description', 'Similarity'],
+    lambda r: [r.get('id', 'N/A'), r.get('description', 'N/A'),
+               f"{r['similarity']:.4f}"]
+)
 
 
 def display_results(results, entity_type):
@@ -448,109 +365,95 @@ def display_results(results, entity_type):
     if not results:
         return
     
-    # Define columns to display based on entity type
-    if entity_type == 'vehicle_types':
-        headers = ['Type ID', 'Make', 'Model', 'Year', 'Similarity']
-        rows = [[r['type_id'], r.get('make', 'N/A'), r.get('model', 'N/A'), 
-                r.get('year', 'N/A'), f"{r['similarity']:.4f}"] for r in results]
-    
-    elif entity_type == 'components':
-        headers = ['Component ID', 'Component Name', 'Similarity']
-        rows = [[r['component_id'], r.get('component_name', 'N/A'), 
-                f"{r['similarity']:.4f}"] for r in results]
-    
-    elif entity_type == 'parts':
-        headers = ['Part ID', 'Part Name', 'Part Number', 'Component', 'Vehicle', 'Similarity']
-        rows = [[r['part_id'], r.get('part_name', 'N/A'), r.get('part_number', 'N/A'),
-                r.get('component_name', 'N/A'), 
-                f"{r.get('year', 'N/A')} {r.get('make', 'N/A')} {r.get('model', 'N/A')}",
-                f"{r['similarity']:.4f}"] for r in results]
-    
-    elif entity_type == 'part_prices':
-        headers = ['Price ID', 'Part Name', 'Quality', 'Price', 'Component', 'Similarity']
-        rows = [[r['price_id'], r.get('part_name', 'N/A'), 
-                r.get('quality', 'N/A'), f"${r.get('price', 'N/A'):.2f}",
-                r.get('component_name', 'N/A'),
-                f"{r['similarity']:.4f}"] for r in results]
+    headers, format_row = RESULT_TABLES.get(entity_type, DEFAULT_RESULT_TABLE)
+    rows = list(map(format_row, results))
     
-    elif entity_type == 'vehicles':
-        headers = ['Vehicle ID', 'Make', 'Model', 'Year', 'Mileage', 'Similarity']
-        rows = [[r['vehicle_id'], r.get('make', 'N/A'), r.get('model', 'N/A'),
-                r.get('year', 'N/A'), r.get('mileage', 'N/A'),
-                f"{r['similarity']:.4f}"] for r in results]
-    
-    elif entity_type == 'failures':
-        headers = ['ID', 'Component', 'Description', 'Similarity']
-        rows = [[r['id'], r.get('component_name', 'N/A'), r['description'],
-                f"{r['similarity']:.4f}"] for r in results]
-    
-    else:
-        headers = ['ID', 'Description', 'Similarity']
-        rows = [[r.get('id', 'N/A'), r.get('description', 'N/A'),
-                f"{r['similarity']:.4f}"] for r in results]
+    from tabulate import tabulate
     
     # Print table
     print("\nSearch Results:")
     print(tabulate(rows, headers=headers, tablefmt="grid"))
 
 
+def run_searches(supabase, query, query_embedding, entity, threshold, limit):
+    """Run the selected entity searches for one query concurrently and display their results."""
+    # The entity searches are independent, so run them concurrently; supabase-py is synchronous,
+    # so each runs in its own thread while the others wait on the network
+    query_embedding = resolve_query_embedding(query, query_embedding)
+    if not query_embedding:
+        return
+    
+    entity_types = [entity_type for entity_type in SEARCH_SPECS if entity == 'all' or entity == entity_type]
+    with ThreadPoolExecutor(max_workers=len(entity_types)) as executor:
+        futures = [
+            (entity_type, executor.submit(match_entities, supabase, SEARCH_SPECS[entity_type]['rpc'],
+                                          SEARCH_SPECS[entity_type]['label'], query_embedding, threshold, limit))
+            for entity_type in entity_types
+        ]
+        
+        # Print each search's header, messages and results in the usual order as each search finishes,
+        # so the output of concurrent searches is not interleaved
+        for entity_type, future in futures:
+            print(f"\nSearching for {SEARCH_SPECS[entity_type]['label']} similar to: '{query}'")
+            results, message = future.result()
+            if message:
+                print(message)
+            if results:
+                display_results(results, entity_type)
+
+
 def main():
     """Main function to perform semantic search."""
     
     parser = argparse.ArgumentParser(description='Perform semantic search on automotive data')
-    parser.add_argument('query', type=str, help='The search query')
+    parser.add_argument('query', type=str, nargs='?', help='The search query')
+    parser.add_argument('--queries-file', '-f', type=str,
+                        help='File with one search query per line, embedded together in batched requests')
     parser.add_argument('--entity', '-e', type=str, default='all',
-                        choices=['all', 'vehicle_types', 'components', 'parts', 'vehicles', 'failures', 'part_prices'],
+                        choices=['all'] + list(SEARCH_SPECS),
                         help='Entity type to search (default: all)')
     parser.add_argument('--threshold', '-t', type=float, default=0.7,
                         help='Similarity threshold (0.0 to 1.0, default: 0.7)')
     parser.add_argument('--limit', '-l', type=int, default=5,
                         help='Maximum number of results to return (default: 5)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always query Supabase instead of reusing recent match results')
     
     args = parser.parse_args()
     
+    if args.no_cache:
+        global rpc_cache
+        rpc_cache = None
+    
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    elif args.query:
+        queries = [args.query]
+    else:
+        parser.error("a query or --queries-file is required")
+    
     print("======== Automotive Semantic Search ========")
-    print(f"Query: '{args.query}'")
+    if len(queries) == 1:
+        print(f"Query: '{queries[0]}'")
+    else:
+        print(f"Queries: {len(queries)} from {args.queries_file}")
     print(f"Entity Type: {args.entity}")
     print(f"Threshold: {args.threshold}")
     print(f"Limit: {args.limit}")
     
     try:
-        # Connect to Supabase
+        # Connect to Supabase while embedding each query once; each embedding is shared across every entity search
         print("\nConnecting to Supabase...")
-        supabase = connect_to_supabase()
+        supabase, query_embeddings = asyncio.run(connect_and_embed(queries))
         print("Connection successful!")
         
-        # Perform search based on entity type
-        if args.entity == 'all' or args.entity == 'vehicle_types':
-            results = search_vehicle_types(supabase, args.query, args.threshold, args.limit)
-            if results:
-                display_results(results, 'vehicle_types')
-        
-        if args.entity == 'all' or args.entity == 'components':
-            results = search_components(supabase, args.query, args.threshold, args.limit)
-            if results:
-                display_results(results, 'components')
-        
-        if args.entity == 'all' or args.entity == 'parts':
-            results = search_parts(supabase, args.query, args.threshold, args.limit)
-            if results:
-                display_results(results, 'parts')
+        if not query_embeddings:
+            print("Failed to generate embedding for the query")
+            return 1
         
-        if args.entity == 'all' or args.entity == 'vehicles':
-            results = search_vehicles(supabase, args.query, args.threshold, args.limit)
-            if results:
-                display_results(results, 'vehicles')
-        
-        if args.entity == 'all' or args.entity == 'failures':
-            results = search_failure_descriptions(supabase, args.query, args.threshold, args.limit)
-            if results:
-                display_results(results, 'failures')
-        
-        if args.entity == 'all' or args.entity == 'part_prices':
-            results = search_part_prices(supabase, args.query, args.threshold, args.limit)
-            if results:
-                display_results(results, 'part_prices')
+        for query, query_embedding in zip(queries, query_embeddings):
+            run_searches(supabase, query, query_embedding, args.entity, args.threshold, args.limit)
         
         print("\nSearch complete!")
         
@@ -562,4 +465,4 @@ def main():
 
 
 if __name__ == "__main__":
-    exit(main()) 
\ No newline at end of file
+    exit(main())
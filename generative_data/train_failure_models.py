@@ -7,7 +7,7 @@ component failures based on vehicle details (make, model, year, mileage).
 """
 
 import os
-import pickle
+import joblib
 import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
@@ -142,10 +142,9 @@ def train_component_model(X, y, component_name):
     print(f"  Recall: {recall:.4f}")
     print(f"  F1 Score: {f1:.4f}")
     
-    # Save model
+    # Save model uncompressed so the app can memory-map its arrays
     model_path = os.path.join(MODELS_DIR, f"{component_name.replace(' ', '_')}_model.pkl")
-    with open(model_path, 'wb') as f:
-        pickle.dump(model, f)
+    joblib.dump(model, model_path, compress=0)
     
     print(f"Model saved to {model_path}")
     
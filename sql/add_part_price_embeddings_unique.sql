@@ -0,0 +1,11 @@
+-- Allow part price embeddings to be upserted on price_id
+-- generate_part_price_embeddings.py upserts with on_conflict='price_id', which needs a unique constraint.
+
+-- Keep only the newest embedding for each price before adding the constraint
+DELETE FROM part_price_embeddings older
+USING part_price_embeddings newer
+WHERE older.price_id = newer.price_id
+  AND older.id < newer.id;
+
+ALTER TABLE part_price_embeddings
+  ADD CONSTRAINT part_price_embeddings_price_id_key UNIQUE (price_id);
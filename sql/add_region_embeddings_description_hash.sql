@@ -0,0 +1,14 @@
+-- Let regional_embeddings.py skip regions whose descriptions have not changed
+-- It stores a hash of each description and upserts with on_conflict='region_id', which needs a unique constraint.
+
+ALTER TABLE region_embeddings
+  ADD COLUMN IF NOT EXISTS description_hash TEXT;
+
+-- Keep only the newest embedding for each region before adding the constraint
+DELETE FROM region_embeddings older
+USING region_embeddings newer
+WHERE older.region_id = newer.region_id
+  AND older.id < newer.id;
+
+ALTER TABLE region_embeddings
+  ADD CONSTRAINT region_embeddings_region_id_key UNIQUE (region_id);
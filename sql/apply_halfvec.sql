@@ -0,0 +1,43 @@
+-- Store entity embeddings as half-precision vectors (requires pgvector 0.7+)
+-- halfvec halves storage and index size with negligible loss in cosine similarity.
+-- Query functions that take vector(1536) keep working: pgvector casts vector to halfvec implicitly.
+
+-- Drop existing vector_cosine_ops indexes; they cannot be rebuilt for the new column type
+DO $$
+DECLARE
+    idx record;
+BEGIN
+    FOR idx IN
+        SELECT indexname FROM pg_indexes
+        WHERE tablename IN ('vehicle_type_embeddings', 'component_embeddings', 'part_embeddings',
+                            'vehicle_embeddings', 'failure_description_embeddings')
+          AND indexdef LIKE '%(embedding%'
+    LOOP
+        EXECUTE format('DROP INDEX IF EXISTS %I', idx.indexname);
+    END LOOP;
+END $$;
+
+-- Update vehicle_type_embeddings
+ALTER TABLE vehicle_type_embeddings
+  ALTER COLUMN embedding TYPE halfvec(1536) USING (embedding::halfvec(1536));
+CREATE INDEX ON vehicle_type_embeddings USING ivfflat (embedding halfvec_cosine_ops);
+
+-- Update component_embeddings
+ALTER TABLE component_embeddings
+  ALTER COLUMN embedding TYPE halfvec(1536) USING (embedding::halfvec(1536));
+CREATE INDEX ON component_embeddings USING ivfflat (embedding halfvec_cosine_ops);
+
+-- Update part_embeddings
+ALTER TABLE part_embeddings
+  ALTER COLUMN embedding TYPE halfvec(1536) USING (embedding::halfvec(1536));
+CREATE INDEX ON part_embeddings USING ivfflat (embedding halfvec_cosine_ops);
+
+-- Update vehicle_embeddings
+ALTER TABLE vehicle_embeddings
+  ALTER COLUMN embedding TYPE halfvec(1536) USING (embedding::halfvec(1536));
+CREATE INDEX ON vehicle_embeddings USING ivfflat (embedding halfvec_cosine_ops);
+
+-- Update failure_description_embeddings
+ALTER TABLE failure_description_embeddings
+  ALTER COLUMN embedding TYPE halfvec(1536) USING (embedding::halfvec(1536));
+CREATE INDEX ON failure_description_embeddings USING ivfflat (embedding halfvec_cosine_ops);
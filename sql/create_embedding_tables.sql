@@ -1,12 +1,14 @@
 -- Create extension if not exists
 CREATE EXTENSION IF NOT EXISTS vector;
 
+-- Embeddings are stored as halfvec (pgvector 0.7+) to halve storage; see apply_halfvec.sql for existing tables
+
 -- Vehicle Type Embeddings
 CREATE TABLE IF NOT EXISTS vehicle_type_embeddings (
     id SERIAL PRIMARY KEY,
     type_id INTEGER REFERENCES vehicle_types(type_id),
     description TEXT NOT NULL,
-    embedding vector(1536) NOT NULL,
+    embedding halfvec(1536) NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -15,7 +17,7 @@ CREATE TABLE IF NOT EXISTS component_embeddings (
     id SERIAL PRIMARY KEY,
     component_id INTEGER REFERENCES components(component_id),
     description TEXT NOT NULL,
-    embedding vector(1536) NOT NULL,
+    embedding halfvec(1536) NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -24,7 +26,7 @@ CREATE TABLE IF NOT EXISTS part_embeddings (
     id SERIAL PRIMARY KEY,
     part_id INTEGER REFERENCES parts(part_id),
     description TEXT NOT NULL,
-    embedding vector(1536) NOT NULL,
+    embedding halfvec(1536) NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -33,7 +35,7 @@ CREATE TABLE IF NOT EXISTS vehicle_embeddings (
     id SERIAL PRIMARY KEY,
     vehicle_id INTEGER REFERENCES vehicles(vehicle_id),
     description TEXT NOT NULL,
-    embedding vector(1536) NOT NULL,
+    embedding halfvec(1536) NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -42,7 +44,7 @@ CREATE TABLE IF NOT EXISTS failure_description_embeddings (
     id SERIAL PRIMARY KEY,
     component_id INTEGER REFERENCES components(component_id),
     description TEXT NOT NULL,
-    embedding vector(1536) NOT NULL,
+    embedding halfvec(1536) NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -0,0 +1,148 @@
+-- Create search functions that return matches already joined with their entity details
+-- semantic_search.py calls these so each entity search is a single round-trip instead of
+-- a match_* call followed by one to three lookups of the matched rows.
+-- match_offset skips the best matches, so results past PostgREST's row cap can be read in pages;
+-- the old three-argument versions are dropped so calls without it are not ambiguous.
+
+DROP FUNCTION IF EXISTS match_vehicle_types_enriched(vector(1536), float, int);
+CREATE OR REPLACE FUNCTION match_vehicle_types_enriched(query_embedding vector(1536), match_threshold float, match_count int, match_offset int DEFAULT 0)
+RETURNS TABLE(
+    id bigint,
+    type_id bigint,
+    description text,
+    similarity float,
+    make text,
+    model text,
+    year int
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT m.id, m.type_id, m.description, m.similarity,
+           vt.make::text, vt.model::text, vt.year
+    FROM match_vehicle_types(query_embedding, match_threshold, match_offset + match_count) m
+    LEFT JOIN vehicle_types vt ON vt.type_id = m.type_id
+    ORDER BY m.similarity DESC, m.id
+    OFFSET match_offset;
+$$;
+
+DROP FUNCTION IF EXISTS match_components_enriched(vector(1536), float, int);
+CREATE OR REPLACE FUNCTION match_components_enriched(query_embedding vector(1536), match_threshold float, match_count int, match_offset int DEFAULT 0)
+RETURNS TABLE(
+    id bigint,
+    component_id bigint,
+    description text,
+    similarity float,
+    component_name text
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT m.id, m.component_id, m.description, m.similarity,
+           c.component_name::text
+    FROM match_components(query_embedding, match_threshold, match_offset + match_count) m
+    LEFT JOIN components c ON c.component_id = m.component_id
+    ORDER BY m.similarity DESC, m.id
+    OFFSET match_offset;
+$$;
+
+DROP FUNCTION IF EXISTS match_parts_enriched(vector(1536), float, int);
+CREATE OR REPLACE FUNCTION match_parts_enriched(query_embedding vector(1536), match_threshold float, match_count int, match_offset int DEFAULT 0)
+RETURNS TABLE(
+    id bigint,
+    part_id bigint,
+    description text,
+    similarity float,
+    part_name text,
+    part_number text,
+    type_id bigint,
+    component_id bigint,
+    component_name text,
+    make text,
+    model text,
+    year int
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT m.id, m.part_id, m.description, m.similarity,
+           p.part_name::text, p.part_number::text, p.type_id::bigint, p.component_id::bigint,
+           c.component_name::text, vt.make::text, vt.model::text, vt.year
+    FROM match_parts(query_embedding, match_threshold, match_offset + match_count) m
+    LEFT JOIN parts p ON p.part_id = m.part_id
+    LEFT JOIN components c ON c.component_id = p.component_id
+    LEFT JOIN vehicle_types vt ON vt.type_id = p.type_id
+    ORDER BY m.similarity DESC, m.id
+    OFFSET match_offset;
+$$;
+
+DROP FUNCTION IF EXISTS match_vehicles_enriched(vector(1536), float, int);
+CREATE OR REPLACE FUNCTION match_vehicles_enriched(query_embedding vector(1536), match_threshold float, match_count int, match_offset int DEFAULT 0)
+RETURNS TABLE(
+    id bigint,
+    vehicle_id bigint,
+    description text,
+    similarity float,
+    type_id bigint,
+    mileage int,
+    make text,
+    model text,
+    year int
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT m.id, m.vehicle_id, m.description, m.similarity,
+           v.type_id::bigint, v.mileage, vt.make::text, vt.model::text, vt.year
+    FROM match_vehicles(query_embedding, match_threshold, match_offset + match_count) m
+    LEFT JOIN vehicles v ON v.vehicle_id = m.vehicle_id
+    LEFT JOIN vehicle_types vt ON vt.type_id = v.type_id
+    ORDER BY m.similarity DESC, m.id
+    OFFSET match_offset;
+$$;
+
+DROP FUNCTION IF EXISTS match_failure_descriptions_enriched(vector(1536), float, int);
+CREATE OR REPLACE FUNCTION match_failure_descriptions_enriched(query_embedding vector(1536), match_threshold float, match_count int, match_offset int DEFAULT 0)
+RETURNS TABLE(
+    id bigint,
+    component_id bigint,
+    description text,
+    similarity float,
+    component_name text
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT m.id, m.component_id, m.description, m.similarity,
+           c.component_name::text
+    FROM match_failure_descriptions(query_embedding, match_threshold, match_offset + match_count) m
+    LEFT JOIN components c ON c.component_id = m.component_id
+    ORDER BY m.similarity DESC, m.id
+    OFFSET match_offset;
+$$;
+
+DROP FUNCTION IF EXISTS match_part_prices_enriched(vector(1536), float, int);
+CREATE OR REPLACE FUNCTION match_part_prices_enriched(query_embedding vector(1536), match_threshold float, match_count int, match_offset int DEFAULT 0)
+RETURNS TABLE(
+    id bigint,
+    price_id bigint,
+    part_id bigint,
+    part_name text,
+    quality text,
+    price decimal(10,2),
+    description text,
+    similarity float,
+    part_number text,
+    component_name text
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT m.id, m.price_id, m.part_id, m.part_name, m.quality, m.price, m.description, m.similarity,
+           p.part_number::text, c.component_name::text
+    FROM match_part_prices(query_embedding, match_threshold, match_offset + match_count) m
+    LEFT JOIN parts p ON p.part_id = m.part_id
+    LEFT JOIN components c ON c.component_id = p.component_id
+    ORDER BY m.similarity DESC, m.id
+    OFFSET match_offset;
+$$;
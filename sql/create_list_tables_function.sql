@@ -0,0 +1,12 @@
+-- Create a function that reports which of the given tables exist in the public schema
+-- Lets scripts check all of their tables in one round-trip, including empty tables
+CREATE OR REPLACE FUNCTION list_tables(names text[])
+RETURNS TABLE(table_name text)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT t.table_name::text
+  FROM information_schema.tables t
+  WHERE t.table_schema = 'public'
+    AND t.table_name = ANY(names);
+$$;
@@ -0,0 +1,13 @@
+-- Create a function that returns which of the given documentation chunk ids are not stored yet
+-- Lets the documentation script skip processed chunks without downloading every stored chunk_id
+CREATE OR REPLACE FUNCTION missing_chunk_ids(ids integer[])
+RETURNS TABLE(chunk_id integer)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT t.id
+  FROM unnest(ids) AS t(id)
+  WHERE NOT EXISTS (
+    SELECT 1 FROM documentation_embeddings d WHERE d.chunk_id = t.id
+  );
+$$;
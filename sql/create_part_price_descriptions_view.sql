@@ -0,0 +1,25 @@
+-- Part price descriptions for embedding, built server-side
+-- generate_part_price_embeddings.py reads (price_id, description) pairs from this view
+-- instead of joining part_prices, parts and components in Python.
+
+CREATE OR REPLACE VIEW part_price_descriptions_v AS
+SELECT
+    pp.price_id,
+    format(
+        'Part: %s (Part Number: %s). Component type: %s. Base price: $%s. Wholesale price: $%s. '
+        'Retail price: $%s. MSRP: $%s. Currency: %s.',
+        p.part_name,
+        p.part_number,
+        c.component_name,
+        to_char(pp.base_price, 'FM999999990.00'),
+        to_char(pp.wholesale_price, 'FM999999990.00'),
+        to_char(pp.retail_price, 'FM999999990.00'),
+        to_char(pp.manufacturer_suggested_price, 'FM999999990.00'),
+        pp.currency
+    ) AS description
+FROM
+    part_prices pp
+    JOIN parts p ON pp.part_id = p.part_id
+    JOIN components c ON p.component_id = c.component_id
+WHERE
+    pp.is_current = TRUE;
@@ -45,7 +45,7 @@ EXECUTE FUNCTION ensure_single_current_price();
 -- Part Price Embeddings Table
 CREATE TABLE IF NOT EXISTS part_price_embeddings (
     id SERIAL PRIMARY KEY,
-    price_id INTEGER NOT NULL REFERENCES part_prices(price_id) ON DELETE CASCADE,
+    price_id INTEGER NOT NULL UNIQUE REFERENCES part_prices(price_id) ON DELETE CASCADE, -- one embedding per price, upserted on price_id
     embedding_model VARCHAR(50) NOT NULL, -- e.g., 'text-embedding-3-small'
     embedding vector(1536) NOT NULL,
     description TEXT NOT NULL, -- The text that was embedded (includes price and part information)
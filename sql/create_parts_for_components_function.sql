@@ -0,0 +1,21 @@
+-- Create a function to fetch parts for several components of one vehicle type
+-- Replaces the per-component vehicle_types/components/parts lookups with a single call
+CREATE OR REPLACE FUNCTION match_parts_for_components(make text, model text, year int, component_names text[])
+RETURNS TABLE(
+    component_name text,
+    part jsonb
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        c.component_name::text,
+        to_jsonb(p) AS part
+    FROM parts p
+    JOIN vehicle_types vt ON vt.type_id = p.type_id
+    JOIN components c ON c.component_id = p.component_id
+    WHERE vt.make = match_parts_for_components.make
+      AND vt.model = match_parts_for_components.model
+      AND vt.year = match_parts_for_components.year
+      AND c.component_name = ANY(match_parts_for_components.component_names);
+$$;
@@ -33,9 +33,10 @@ CREATE INDEX idx_region_vehicle_types_type ON region_vehicle_types(type_id);
 -- Table for region embeddings (for semantic search)
 CREATE TABLE region_embeddings (
   id SERIAL PRIMARY KEY,
-  region_id INTEGER REFERENCES regions(region_id) NOT NULL,
+  region_id INTEGER REFERENCES regions(region_id) NOT NULL UNIQUE,
   embedding_model VARCHAR,
   embedding VECTOR,
   description TEXT,
+  description_hash TEXT,
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
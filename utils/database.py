@@ -4,11 +4,84 @@ Database utilities for connecting to Supabase and managing data.
 """
 
 import os
+import io
+import json
+import math
+import httpx
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+# Optional psycopg2 import for COPY-based bulk uploads over a direct Postgres connection
+try:
+    import psycopg2
+    from psycopg2 import sql, pool
+    psycopg2_available = True
+except ImportError:
+    psycopg2_available = False
+
+# Optional h2 import for HTTP/2 connections (many concurrent requests over one connection)
+try:
+    import h2
+    http2_available = True
+except ImportError:
+    http2_available = False
+
+# Optional pyarrow import for its multi-threaded CSV reader
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    pyarrow_available = True
+except ImportError:
+    pyarrow_available = False
+
+# Conflict keys used to upsert each source table (failures has a SERIAL id, so it upserts on its natural key)
+TABLE_PRIMARY_KEYS = {
+    'vehicle_types': 'type_id',
+    'vehicles': 'vehicle_id',
+    'components': 'component_id',
+    'parts': 'part_id',
+    'failures': 'vehicle_id,component_id'
+}
+
+# Concurrent REST upload requests, kept within the Supabase connection pool size
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "5"))
+
+# Size of the direct Postgres connection pool, kept well under Supabase's connection limit
+POSTGRES_POOL_MIN_SIZE = 1
+POSTGRES_POOL_MAX_SIZE = 5
+
+# Idle keep-alive connections held open per HTTP client, and how long they stay open
+HTTP_KEEPALIVE_CONNECTIONS = 32
+HTTP_KEEPALIVE_EXPIRY = 30
+
+# Timeout in seconds for Supabase REST requests (matches the supabase-py default)
+SUPABASE_TIMEOUT = 120
+
+def create_http_client(timeout: float = SUPABASE_TIMEOUT,
+                       max_keepalive_connections: int = HTTP_KEEPALIVE_CONNECTIONS) -> httpx.Client:
+    """
+    Create an httpx client that keeps connections alive between requests, using HTTP/2 when h2 is installed.
+    
+    Args:
+        timeout: Request timeout in seconds
+        max_keepalive_connections: Idle connections kept open for reuse
+        
+    Returns:
+        httpx client
+    """
+    return httpx.Client(
+        http2=http2_available,
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+    )
+
 
 def connect_to_supabase() -> Client:
     """
@@ -28,8 +101,19 @@ def connect_to_supabase() -> Client:
         raise ValueError("Supabase credentials not found in environment variables. "
                          "Please set SUPABASE_URL and SUPABASE_KEY.")
     
+    # Share one pooled HTTP client across the REST, storage and functions clients
+    # (supabase-py versions without the httpx_client option fall back to their own clients)
+    try:
+        from supabase.lib.client_options import SyncClientOptions
+        options = SyncClientOptions(httpx_client=create_http_client())
+    except (ImportError, TypeError):
+        options = None
+    
     # Create Supabase client
-    supabase = create_client(supabase_url, supabase_key)
+    if options is not None:
+        supabase = create_client(supabase_url, supabase_key, options=options)
+    else:
+        supabase = create_client(supabase_url, supabase_key)
     
     return supabase
 
@@ -104,6 +188,173 @@ def create_tables(supabase: Client) -> None:
     print("4. Once tables are created, you can proceed with data upload")
 
 
+def get_postgres_pool(database_url: str):
+    """
+    Get a pool of direct Postgres connections (singleton pattern).
+    Reusing connections avoids a new TCP and TLS handshake for every COPY upload.
+    
+    Args:
+        database_url: Postgres connection string
+        
+    Returns:
+        psycopg2 ThreadedConnectionPool
+    """
+    global _postgres_pool
+    
+    if '_postgres_pool' not in globals() or _postgres_pool is None:
+        _postgres_pool = pool.ThreadedConnectionPool(POSTGRES_POOL_MIN_SIZE, POSTGRES_POOL_MAX_SIZE, database_url)
+    
+    return _postgres_pool
+
+
+def _get_live_connection(connection_pool):
+    """Take a connection from the pool, replacing it if the server has dropped it while idle."""
+    conn = connection_pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        connection_pool.putconn(conn, close=True)
+        return connection_pool.getconn()
+
+
+def format_vector(value: np.ndarray) -> str:
+    """Format a float32 vector as a pgvector text literal, using the shortest float32 digits."""
+    return '[' + ','.join(value.astype(str)) + ']'
+
+
+def _copy_csv_field(value) -> str:
+    """Format a value as a Postgres COPY CSV field, leaving NULLs unquoted and empty."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, np.ndarray):
+        # The vector literal contains commas, so it must be quoted like any other text field
+        return '"' + format_vector(value) + '"'
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_rows_to_postgres(database_url: str, table_name: str, rows: List[dict],
+                          on_conflict: Optional[str] = None) -> None:
+    """
+    Bulk load rows into a table with COPY FROM STDIN.
+    
+    Args:
+        database_url: Postgres connection string
+        table_name: Destination table
+        rows: Rows to load, all with the same keys
+        on_conflict: Comma-separated conflict columns; when given, rows are upserted via a staging table
+    """
+    columns = list(rows[0].keys())
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join(_copy_csv_field(row.get(column)) for column in columns))
+        buffer.write('\n')
+    buffer.seek(0)
+    
+    table = sql.Identifier(table_name)
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    
+    connection_pool = get_postgres_pool(database_url)
+    conn = _get_live_connection(connection_pool)
+    try:
+        with conn, conn.cursor() as cur:
+            if not on_conflict:
+                cur.copy_expert(sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(table, column_list), buffer)
+                return
+            
+            # COPY cannot upsert, so load a staging table and merge it in one statement
+            conflict_columns = [column.strip() for column in on_conflict.split(',')]
+            update_columns = [column for column in columns if column not in conflict_columns]
+            cur.execute(sql.SQL("CREATE TEMP TABLE bulk_upload_staging (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(table))
+            cur.copy_expert(sql.SQL("COPY bulk_upload_staging ({}) FROM STDIN WITH (FORMAT csv)").format(column_list), buffer)
+            
+            if update_columns:
+                conflict_action = sql.SQL("DO UPDATE SET {}").format(sql.SQL(', ').join(
+                    sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column)) for column in update_columns
+                ))
+            else:
+                conflict_action = sql.SQL("DO NOTHING")
+            cur.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM bulk_upload_staging ON CONFLICT ({}) {}").format(
+                table, column_list, column_list,
+                sql.SQL(', ').join(map(sql.Identifier, conflict_columns)),
+                conflict_action
+            ))
+    finally:
+        connection_pool.putconn(conn)
+
+
+def bulk_upload(supabase: Client, table_name: str, rows: List[dict],
+                on_conflict: Optional[str] = None, chunk_size: int = 1000,
+                max_workers: int = UPLOAD_WORKERS) -> bool:
+    """
+    Upload many rows at once, using COPY when a direct Postgres connection is configured.
+    
+    If DATABASE_URL is set and psycopg2 is installed, rows are streamed with COPY FROM STDIN.
+    Otherwise they are upserted through the Supabase REST API in chunks sent concurrently.
+    
+    Args:
+        supabase: Supabase client
+        table_name: Destination table
+        rows: Rows to upload, all with the same keys
+        on_conflict: Comma-separated conflict columns for upserts
+        chunk_size: Rows per REST request
+        max_workers: Maximum number of concurrent REST requests
+        
+    Returns:
+        True if every row was uploaded without errors
+    """
+    if not rows:
+        return True
+    
+    database_url = os.getenv("DATABASE_URL")
+    if database_url and psycopg2_available:
+        try:
+            copy_rows_to_postgres(database_url, table_name, rows, on_conflict=on_conflict)
+            return True
+        except Exception as e:
+            print(f"COPY into {table_name} failed, falling back to REST upserts: {str(e)}")
+    
+    upsert_options = {'on_conflict': on_conflict} if on_conflict else {}
+    if on_conflict:
+        # Sort by the conflict key so concurrent chunks touch disjoint key ranges; rows without
+        # the key (e.g. a SERIAL column the database fills in) are uploaded in their given order
+        conflict_columns = [column.strip() for column in on_conflict.split(',')]
+        if all(column in rows[0] for column in conflict_columns):
+            # NULLs sort last; keys of mixed types cannot be ordered, so those rows keep their order
+            try:
+                rows = sorted(rows, key=lambda row: tuple(
+                    (row[column] is None, row[column]) for column in conflict_columns
+                ))
+            except TypeError:
+                pass
+    
+    def upload_chunk(start):
+        # numpy vectors are not JSON serializable, so send them as pgvector text literals
+        chunk = [
+            {key: format_vector(value) if isinstance(value, np.ndarray) else value for key, value in row.items()}
+            for row in rows[start:start + chunk_size]
+        ]
+        response = supabase.table(table_name).upsert(chunk, **upsert_options).execute()
+        
+        if hasattr(response, 'error') and response.error:
+            print(f"Error uploading rows {start}-{start + chunk_size} to {table_name}: {response.error}")
+            return False
+        return True
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(upload_chunk, range(0, len(rows), chunk_size)))
+    
+    return all(results)
+
+
 def upload_data_to_supabase(supabase: Client, data_dict: Dict[str, pd.DataFrame]) -> None:
     """
     Upload data to Supabase tables.
@@ -119,15 +370,43 @@ def upload_data_to_supabase(supabase: Client, data_dict: Dict[str, pd.DataFrame]
         print(f"Uploading {len(data_list)} records to {table_name} table...")
         
         # Insert data using upsert to handle duplicates
-        response = supabase.table(table_name).upsert(data_list).execute()
-        
-        # Check for errors
-        if hasattr(response, 'error') and response.error:
-            print(f"Error uploading to {table_name}: {response.error}")
-        else:
+        if bulk_upload(supabase, table_name, data_list, on_conflict=TABLE_PRIMARY_KEYS.get(table_name)):
             print(f"Successfully uploaded data to {table_name}")
 
 
+def read_csv_fast(file_path: str) -> pd.DataFrame:
+    """
+    Read a CSV file with pyarrow's multi-threaded reader, falling back to pandas.
+    
+    Values keep the types pandas would give them: empty strings are missing and
+    date-like text stays text, so records remain JSON-serializable for uploads.
+    
+    Args:
+        file_path: Path to the CSV file
+        
+    Returns:
+        DataFrame with the file's contents
+    """
+    if not pyarrow_available:
+        return pd.read_csv(file_path)
+    
+    read_options = pacsv.ReadOptions(use_threads=True, block_size=1 << 20)
+    convert_options = pacsv.ConvertOptions(strings_can_be_null=True)
+    table = pacsv.read_csv(file_path, read_options=read_options, convert_options=convert_options)
+    
+    # pyarrow infers dates and timestamps where pandas keeps strings; re-read those columns as text
+    temporal_columns = [field.name for field in table.schema
+                        if pa.types.is_temporal(field.type)]
+    if temporal_columns:
+        convert_options = pacsv.ConvertOptions(
+            strings_can_be_null=True,
+            column_types={column: pa.string() for column in temporal_columns}
+        )
+        table = pacsv.read_csv(file_path, read_options=read_options, convert_options=convert_options)
+    
+    return table.to_pandas()
+
+
 def load_data_from_csv(data_dir: str = 'data') -> Dict[str, pd.DataFrame]:
     """
     Load data from CSV files.
@@ -146,7 +425,7 @@ def load_data_from_csv(data_dir: str = 'data') -> Dict[str, pd.DataFrame]:
         if os.path.exists(file_path):
             # Extract table name from file name
             table_name = os.path.splitext(file_name)[0]
-            data_dict[table_name] = pd.read_csv(file_path)
+            data_dict[table_name] = read_csv_fast(file_path)
             print(f"Loaded {table_name} data: {len(data_dict[table_name])} records")
         else:
             print(f"Warning: File not found: {file_path}")
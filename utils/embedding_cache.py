@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for text embeddings.
+
+Embeddings are stored in SQLite keyed by a hash of the embedding model and the
+exact text sent to the API, so re-running an embedding job only calls the API
+for texts that have not been embedded with that model before.
+"""
+
+import os
+import sqlite3
+import hashlib
+import numpy as np
+from typing import Callable, List, Optional
+
+# Optional blake3 import for faster hashing
+try:
+    from blake3 import blake3
+    blake3_available = True
+except ImportError:
+    blake3_available = False
+
+# Default location of the cache database
+DEFAULT_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite")
+
+# SQLite limits the number of bound parameters per statement
+_MAX_QUERY_PARAMS = 500
+
+
+def embedding_key(text: str, model: str) -> bytes:
+    """
+    Compute the cache key for a text embedded with a given model.
+
+    Args:
+        text: Text exactly as sent to the embeddings API
+        model: Embedding model name
+
+    Returns:
+        32-byte digest of the model and text
+    """
+    payload = f"{model}\0{text}".encode()
+    if blake3_available:
+        return blake3(payload).digest()
+    return hashlib.sha256(payload).digest()
+
+
+class EmbeddingCache:
+    """SQLite-backed cache mapping (model, text) to a float32 embedding vector."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, model TEXT, vec BLOB)"
+        )
+        self.conn.commit()
+
+    def get_many(self, texts: List[str], model: str) -> List[Optional[np.ndarray]]:
+        """
+        Look up cached embeddings for a list of texts.
+
+        Args:
+            texts: Texts exactly as sent to the embeddings API
+            model: Embedding model name
+
+        Returns:
+            float32 embeddings in the same order as texts, with None for cache misses
+        """
+        keys = [embedding_key(text, model) for text in texts]
+        found = {}
+
+        for start in range(0, len(keys), _MAX_QUERY_PARAMS):
+            chunk = keys[start:start + _MAX_QUERY_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT hash, vec FROM embeddings WHERE hash IN ({placeholders})", chunk
+            )
+            for key, vec in rows:
+                found[key] = np.frombuffer(vec, dtype=np.float32)
+
+        return [found.get(key) for key in keys]
+
+    def put_many(self, texts: List[str], embeddings: List[Optional[np.ndarray]], model: str) -> None:
+        """
+        Store embeddings for a list of texts, skipping failed (None) embeddings.
+
+        Args:
+            texts: Texts exactly as sent to the embeddings API
+            embeddings: Embedding vectors in the same order as texts
+            model: Embedding model name
+        """
+        rows = [
+            (embedding_key(text, model), model, np.asarray(embedding, dtype=np.float32).tobytes())
+            for text, embedding in zip(texts, embeddings)
+            if embedding is not None
+        ]
+        self.conn.executemany("INSERT OR REPLACE INTO embeddings (hash, model, vec) VALUES (?, ?, ?)", rows)
+        self.conn.commit()
+
+    def get_or_compute_many(self, texts: List[str], model: str,
+                            compute: Callable[[List[str]], List[Optional[List[float]]]]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings for a list of texts, computing and storing only the cache misses.
+
+        Args:
+            texts: Texts exactly as sent to the embeddings API
+            model: Embedding model name
+            compute: Function returning embeddings (None for failures) for a list of distinct texts
+
+        Returns:
+            float32 embeddings in the same order as texts, with None where compute failed
+        """
+        embeddings = self.get_many(texts, model)
+
+        missing_texts = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing_texts:
+            computed = compute(missing_texts)
+            self.put_many(missing_texts, computed, model)
+
+            computed_by_text = {
+                text: None if embedding is None else np.asarray(embedding, dtype=np.float32)
+                for text, embedding in zip(missing_texts, computed)
+            }
+            embeddings = [
+                computed_by_text[text] if embedding is None else embedding
+                for text, embedding in zip(texts, embeddings)
+            ]
+
+        return embeddings
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        self.conn.close()
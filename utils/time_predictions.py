@@ -3,6 +3,7 @@
 Utility functions for time-based component failure predictions.
 """
 
+import asyncio
 import pandas as pd
 import numpy as np
 from datetime import datetime, timezone
@@ -120,6 +121,25 @@ def estimate_future_mileage(vehicle_data, months_ahead, supabase=None):
     
     return future_mileage
 
+async def estimate_future_mileages(vehicle_data, time_windows, supabase=None):
+    """
+    Estimate future mileage for several time windows concurrently.
+    
+    Args:
+        vehicle_data: Dictionary containing vehicle information
+        time_windows: List of time windows in months
+        supabase: Optional Supabase client instance
+        
+    Returns:
+        List of estimated future mileages, one per time window
+    """
+    # Each estimate may query Supabase, so overlap them on worker threads;
+    # every task gets its own copy since the estimate updates the mileage in place
+    return await asyncio.gather(*[
+        asyncio.to_thread(estimate_future_mileage, vehicle_data.copy(), months, supabase)
+        for months in time_windows
+    ])
+
 def calculate_failure_probability_at_mileage(model, vehicle_data, target_mileage):
     """
     Calculate failure probability at a specific mileage.
@@ -159,13 +179,13 @@ def predict_failure_timeline(models, vehicle_data, time_windows=[3, 6, 12, 24],
     """
     timeline_predictions = {}
     
+    # Projected mileage doesn't depend on the component, so estimate it once per time window
+    future_mileages = asyncio.run(estimate_future_mileages(vehicle_data, time_windows, supabase))
+    
     for component_name, model in models.items():
         timeline_predictions[component_name] = {}
         
-        for months in time_windows:
-            # Estimate future mileage at this time point
-            future_mileage = estimate_future_mileage(vehicle_data, months, supabase)
-            
+        for months, future_mileage in zip(time_windows, future_mileages):
             # Calculate failure probability at that mileage
             prob = calculate_failure_probability_at_mileage(model, vehicle_data, future_mileage)
             